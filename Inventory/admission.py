@@ -0,0 +1,195 @@
+from flask import Blueprint, current_app, g, jsonify, request, session
+import threading
+import logging
+import math
+import time
+import os
+
+# Admission control. Endpoints are tagged with a request class; each class
+# gets a per-worker concurrency limit and a bounded wait queue. When a class
+# is saturated, further requests are turned away at once with 429 (queue
+# full) or 503 (waited too long), both carrying Retry-After, instead of
+# tying up worker threads. Heavy reports can therefore never take every
+# thread, and the interactive forms keep a fixed share of each worker.
+#
+# Tag a view with @request_class('heavy'); untagged views are interactive.
+# Class None (static assets) bypasses admission entirely.
+
+admission_bp = Blueprint('admission', __name__, url_prefix='/admin/admission')
+
+DEFAULT_CLASS = 'interactive'
+EXEMPT_ENDPOINTS = {'static', 'assets.serve_asset'}
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class Gate:
+    """Concurrency limit plus a bounded, timed wait queue for one request class."""
+
+    def __init__(self, name, limit, max_queue, max_wait):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_waiting = 0
+        self.avg_seconds = 0.0
+
+    def acquire(self):
+        """Returns None once admitted, or the HTTP status to reject with."""
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return None
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return 429
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return 503
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return None
+
+    def release(self, seconds):
+        with self._cond:
+            self.active -= 1
+            # exponentially weighted, for Retry-After estimates
+            self.avg_seconds = seconds if not self.avg_seconds else 0.8 * self.avg_seconds + 0.2 * seconds
+            self._cond.notify()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: queued work divided over the slots."""
+        with self._cond:
+            backlog = (self.waiting + self.active) * max(self.avg_seconds, 0.1)
+        return max(1, math.ceil(backlog / self.limit))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'max_queue': self.max_queue,
+                'max_wait_seconds': self.max_wait,
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'peak_queue_depth': self.peak_waiting,
+                'admitted': self.admitted,
+                'rejected_429': self.rejected,
+                'timed_out_503': self.timed_out,
+                'avg_seconds': round(self.avg_seconds, 4),
+            }
+
+
+# Limits are per worker process and carved out of its INVENTORY_THREADS
+# gthread threads (see gunicorn.conf.py). A queued request waits inside its
+# thread, so queue slots cost threads too: heavy and stream requests are
+# never queued, only admitted or turned away, and active plus queued
+# requests across all classes never exceed the thread count. Whatever heavy
+# and stream cannot take stays reserved for interactive requests.
+THREADS = _env_int('INVENTORY_THREADS', 8)
+HEAVY_LIMIT = _env_int('INVENTORY_HEAVY_CONCURRENCY', max(1, THREADS // 8))
+STREAM_LIMIT = _env_int('INVENTORY_STREAM_CONCURRENCY', max(1, THREADS // 4))
+INTERACTIVE_QUEUE = _env_int('INVENTORY_INTERACTIVE_QUEUE', max(1, THREADS // 8))
+INTERACTIVE_LIMIT = _env_int('INVENTORY_INTERACTIVE_CONCURRENCY',
+                             max(1, THREADS - HEAVY_LIMIT - STREAM_LIMIT - INTERACTIVE_QUEUE))
+
+GATES = {
+    'interactive': Gate('interactive', INTERACTIVE_LIMIT, INTERACTIVE_QUEUE, _env_float('INVENTORY_INTERACTIVE_WAIT', 2)),
+    'heavy': Gate('heavy', HEAVY_LIMIT, 0, 0),
+    'stream': Gate('stream', STREAM_LIMIT, 0, 0),
+}
+
+if sum(gate.limit + gate.max_queue for gate in GATES.values()) > THREADS:
+    logging.warning(f'Admission limits exceed INVENTORY_THREADS={THREADS}; interactive requests may starve')
+
+
+def request_class(name):
+    """Tag a view function with its admission class."""
+    if name is not None and name not in GATES:
+        raise ValueError(f'Unknown request class: {name}')
+
+    def decorator(f):
+        f.request_class = name
+        return f
+    return decorator
+
+
+def _class_for(endpoint):
+    if endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+        return None
+    view = current_app.view_functions.get(endpoint)
+    return getattr(view, 'request_class', DEFAULT_CLASS)
+
+
+def _admit():
+    name = _class_for(request.endpoint)
+    if name is None:
+        return None
+    gate = GATES[name]
+    status = gate.acquire()
+    if status is not None:
+        logging.warning(f'Admission: {status} for {request.endpoint} ({name} class saturated)')
+        message = 'Too many requests of this kind are queued' if status == 429 else 'Server is busy'
+        response = jsonify({'success': False, 'message': f'{message}, please retry shortly.'})
+        response.status_code = status
+        response.headers['Retry-After'] = str(gate.retry_after())
+        return response
+    g.admission = (gate, time.perf_counter())
+    return None
+
+
+def _release():
+    admission = g.pop('admission', None)
+    if admission is not None:
+        gate, started = admission
+        gate.release(time.perf_counter() - started)
+
+
+def _hand_off(response):
+    # Streamed bodies (downloads, /events) keep the slot until the body is done.
+    admission = g.pop('admission', None)
+    if admission is not None:
+        gate, started = admission
+        response.call_on_close(lambda: gate.release(time.perf_counter() - started))
+    return response
+
+
+def _teardown(exc):
+    # Reached without _hand_off only when the view raised.
+    _release()
+
+
+def init_admission(app):
+    app.before_request_funcs.setdefault(None, []).insert(0, _admit)
+    app.after_request(_hand_off)
+    app.teardown_request(_teardown)
+    app.register_blueprint(admission_bp)
+
+
+@admission_bp.route('')
+@request_class(None)
+def metrics():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied: Admins only.'}), 403
+    return jsonify({'pid': os.getpid(), 'classes': {name: gate.stats() for name, gate in GATES.items()}})
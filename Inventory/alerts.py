@@ -0,0 +1,122 @@
+from flask import session
+from db import get_db_connection
+
+# Low-stock alerting. Reorder thresholds are set per item, or per subcategory
+# as the default for every item in it. stock_alerts holds the items that are
+# currently at or below their threshold. Only the items touched by a write are
+# re-evaluated, so reading the alert list never recomputes stock balances.
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS reorder_thresholds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER,
+        subcategory_id INTEGER,
+        threshold INTEGER NOT NULL,
+        CHECK ((item_id IS NULL) <> (subcategory_id IS NULL)),
+        FOREIGN KEY (item_id) REFERENCES items (id),
+        FOREIGN KEY (subcategory_id) REFERENCES subcategories (id)
+    )''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_reorder_thresholds_item ON reorder_thresholds (item_id) WHERE item_id IS NOT NULL',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_reorder_thresholds_subcategory ON reorder_thresholds (subcategory_id) WHERE subcategory_id IS NOT NULL',
+    '''CREATE TABLE IF NOT EXISTS stock_alerts (
+        item_id INTEGER PRIMARY KEY,
+        balance INTEGER NOT NULL,
+        threshold INTEGER NOT NULL,
+        since TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (item_id) REFERENCES items (id)
+    )''',
+]
+
+ITEM_LEVELS_SQL = '''
+    SELECT i.id as item_id,
+           COALESCE((SELECT SUM(p.quantity) FROM purchases p WHERE p.item_id = i.id), 0)
+             - COALESCE((SELECT SUM(CASE WHEN iss.is_return = 0 THEN iss.quantity ELSE 0 END) FROM issues iss WHERE iss.item_id = i.id), 0) as balance,
+           COALESCE(ti.threshold, ts.threshold) as threshold
+    FROM items i
+    LEFT JOIN reorder_thresholds ti ON ti.item_id = i.id
+    LEFT JOIN reorder_thresholds ts ON ts.subcategory_id = i.subcategory_id
+    WHERE i.id IN ({placeholders})
+'''
+
+ALERTS_SQL = '''
+    SELECT a.item_id, c.name as category, s.name as subcategory, i.specs,
+           a.balance, a.threshold, a.since
+    FROM stock_alerts a
+    JOIN items i ON a.item_id = i.id
+    LEFT JOIN categories c ON i.category_id = c.id
+    LEFT JOIN subcategories s ON i.subcategory_id = s.id
+    ORDER BY a.balance - a.threshold, c.name, s.name
+'''
+
+
+def init_alerts(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def evaluate_items(conn, item_ids):
+    """Re-check `item_ids` against their thresholds and update stock_alerts.
+
+    Runs inside the caller's transaction, so the alert set commits (or rolls
+    back) together with the purchase or issue that changed the stock.
+    Returns True if the alert set changed.
+    """
+    item_ids = sorted({int(i) for i in item_ids if i})
+    if not item_ids:
+        return False
+    before = conn.total_changes
+    for start in range(0, len(item_ids), 500):
+        chunk = item_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        levels = conn.execute(ITEM_LEVELS_SQL.format(placeholders=placeholders), chunk).fetchall()
+        low = [(r['item_id'], r['balance'], r['threshold']) for r in levels
+               if r['threshold'] is not None and r['balance'] <= r['threshold']]
+        low_ids = {r[0] for r in low}
+        conn.executemany('''
+            INSERT INTO stock_alerts (item_id, balance, threshold) VALUES (?, ?, ?)
+            ON CONFLICT (item_id) DO UPDATE SET balance = excluded.balance, threshold = excluded.threshold
+        ''', low)
+        conn.executemany('DELETE FROM stock_alerts WHERE item_id = ?', [(i,) for i in chunk if i not in low_ids])
+    return conn.total_changes > before
+
+
+def rebuild_alerts(conn):
+    """Evaluate every item; used after thresholds change in bulk."""
+    conn.execute('DELETE FROM stock_alerts')
+    evaluate_items(conn, [r['id'] for r in conn.execute('SELECT id FROM items')])
+
+
+def set_threshold(conn, threshold, item_id=None, subcategory_id=None):
+    """Set or clear (threshold=None) a reorder threshold and re-evaluate affected items."""
+    if (item_id is None) == (subcategory_id is None):
+        raise ValueError('Exactly one of item_id or subcategory_id is required')
+    if item_id is not None:
+        conn.execute('DELETE FROM reorder_thresholds WHERE item_id = ?', (item_id,))
+        affected = [item_id]
+    else:
+        conn.execute('DELETE FROM reorder_thresholds WHERE subcategory_id = ?', (subcategory_id,))
+        affected = [r['id'] for r in conn.execute('SELECT id FROM items WHERE subcategory_id = ?', (subcategory_id,))]
+    if threshold is not None:
+        conn.execute('INSERT INTO reorder_thresholds (item_id, subcategory_id, threshold) VALUES (?, ?, ?)',
+                     (item_id, subcategory_id, int(threshold)))
+    evaluate_items(conn, affected)
+    conn.commit()
+
+
+def get_alerts(conn):
+    return [dict(row) for row in conn.execute(ALERTS_SQL)]
+
+
+def alert_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM stock_alerts').fetchone()[0]
+
+
+def inject_alert_count():
+    """Context processor for the navigation badge."""
+    if 'user_id' not in session:
+        return {}
+    conn = get_db_connection()
+    count = alert_count(conn)
+    conn.close()
+    return {'low_stock_count': count}
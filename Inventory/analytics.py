@@ -0,0 +1,412 @@
+from array import array
+from datetime import date
+from functools import lru_cache
+import json
+import sys
+
+from reports import parse_report_date
+from staffing import ISSUE_STAFF_ID_SQL
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the array module fallback gives the same results
+    np = None
+
+# Compact columnar snapshot of purchases and issues for analytical reports.
+# Each column is a typed array (or NumPy view of one), and repeated strings
+# such as categories, departments and vendors are dictionary-encoded into
+# small integer codes. A row costs a few dozen bytes instead of a dict of
+# Python strings, and group-bys become bincounts over the code columns.
+
+NO_DATE = 0  # ordinal used for missing or unparseable dates
+
+LAPTOP_LIFE_DAYS = 1642
+LAPTOP_ELIGIBILITY_DAYS = 547
+LAPTOP_AGE_POLICY = '4.5 Years'
+
+
+class Dictionary:
+    """Maps repeated strings to dense integer codes. Code 0 is reserved for NULL."""
+
+    def __init__(self):
+        self.values = [None]
+        self._codes = {None: 0}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code_of(self, value):
+        return self._codes.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+# histories repeat the same few thousand dates; parse each one once
+@lru_cache(maxsize=8192)
+def _date_ordinal(value):
+    parsed = parse_report_date(value)
+    return parsed.toordinal() if parsed else NO_DATE
+
+
+class Table:
+    """A set of equal-length typed columns."""
+
+    def __init__(self, typecodes):
+        self.columns = {name: array(typecode) for name, typecode in typecodes.items()}
+
+    def append(self, row):
+        for name, value in row.items():
+            self.columns[name].append(value)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        column = self.columns[name]
+        return np.frombuffer(column, dtype=column.typecode) if np is not None and len(column) else column
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in self.columns.values())
+
+
+class Snapshot:
+    def __init__(self):
+        self.categories = Dictionary()
+        self.subcategories = Dictionary()
+        self.vendors = Dictionary()
+        self.departments = Dictionary()
+        self.staff = Dictionary()
+        self.specs = Dictionary()
+        self.serials = Dictionary()
+        self.remarks = Dictionary()
+        self.purchases = Table({'item_id': 'q', 'category': 'l', 'subcategory': 'l', 'vendor': 'l',
+                                'quantity': 'q', 'unit_price': 'd', 'date': 'l', 'remarks': 'l'})
+        # staff_id is 0 for issues that match no staff member; staff is the
+        # name shown on the issue, kept for display only
+        self.issues = Table({'id': 'q', 'item_id': 'q', 'category': 'l', 'subcategory': 'l', 'department': 'l',
+                             'staff_id': 'q', 'staff': 'l', 'quantity': 'q', 'is_return': 'b', 'date': 'l',
+                             'specs': 'l', 'serial_no': 'l'})
+        # staff id -> joining date ordinal
+        self.staff_joined = array('l')
+
+    def nbytes(self):
+        dictionaries = (self.categories, self.subcategories, self.vendors, self.departments, self.staff,
+                        self.specs, self.serials, self.remarks)
+        strings = sum(sys.getsizeof(v) for d in dictionaries for v in d.values if v is not None)
+        return self.purchases.nbytes() + self.issues.nbytes() + self.staff_joined.itemsize * len(self.staff_joined) + strings
+
+
+def load_snapshot(conn):
+    """Stream purchases, issues and staff joining dates into a columnar Snapshot."""
+    snap = Snapshot()
+    for row in conn.execute('''
+        SELECT p.item_id, c.name as category, s.name as subcategory, p.vendor, p.quantity, p.unit_price, p.date, p.remarks
+        FROM purchases p
+        LEFT JOIN items i ON p.item_id = i.id
+        LEFT JOIN categories c ON i.category_id = c.id
+        LEFT JOIN subcategories s ON i.subcategory_id = s.id
+    '''):
+        snap.purchases.append({
+            'item_id': row['item_id'] or 0,
+            'category': snap.categories.encode(row['category']),
+            'subcategory': snap.subcategories.encode(row['subcategory']),
+            'vendor': snap.vendors.encode(row['vendor']),
+            'quantity': row['quantity'] or 0,
+            'unit_price': row['unit_price'] or 0.0,
+            'date': _date_ordinal(row['date']),
+            'remarks': snap.remarks.encode(row['remarks'])
+        })
+
+    for row in conn.execute('SELECT id, date_of_joining FROM staff'):
+        _grow(snap.staff_joined, row['id'] + 1)
+        snap.staff_joined[row['id']] = _date_ordinal(row['date_of_joining'])
+
+    for row in conn.execute(f'''
+        SELECT iss.id, iss.item_id, c.name as category, s.name as subcategory, iss.department,
+               {ISSUE_STAFF_ID_SQL} as staff_id, iss.staff_name, iss.quantity, iss.is_return, iss.date,
+               iss.specs, iss.serial_no
+        FROM issues iss
+        LEFT JOIN items i ON iss.item_id = i.id
+        LEFT JOIN categories c ON i.category_id = c.id
+        LEFT JOIN subcategories s ON i.subcategory_id = s.id
+    '''):
+        snap.issues.append({
+            'id': row['id'],
+            'item_id': row['item_id'] or 0,
+            'category': snap.categories.encode(row['category']),
+            'subcategory': snap.subcategories.encode(row['subcategory']),
+            'department': snap.departments.encode(row['department']),
+            'staff_id': row['staff_id'] or 0,
+            'staff': snap.staff.encode(row['staff_name']),
+            'quantity': row['quantity'] or 0,
+            'is_return': 1 if row['is_return'] else 0,
+            'date': _date_ordinal(row['date']),
+            'specs': snap.specs.encode(row['specs']),
+            'serial_no': snap.serials.encode(row['serial_no'])
+        })
+        _grow(snap.staff_joined, (row['staff_id'] or 0) + 1)
+    return snap
+
+
+def _grow(column, size):
+    while len(column) < size:
+        column.append(NO_DATE)
+
+
+def group_sum(codes, values, size):
+    """Sum `values` per code in [0, size)."""
+    if np is not None:
+        if not len(codes):
+            return np.zeros(size)
+        return np.bincount(codes, weights=values, minlength=size)
+    totals = [0] * size
+    for code, value in zip(codes, values):
+        totals[code] += value
+    return totals
+
+
+def add_days(ordinals, days):
+    """Shift date ordinals by `days`, keeping missing dates missing."""
+    if np is not None:
+        ordinals = np.asarray(ordinals)
+        return np.where(ordinals != NO_DATE, ordinals + days, NO_DATE)
+    return array('l', (o + days if o != NO_DATE else NO_DATE for o in ordinals))
+
+
+def first_row_by(keys, ordinals, size):
+    """Position of the earliest dated row per key in [0, size), falling back to an
+    undated row, and -1 where a key has no rows at all."""
+    if np is not None:
+        keys, ordinals = np.asarray(keys, dtype=np.int64), np.asarray(ordinals, dtype=np.int64)
+        first = np.full(size, -1, dtype=np.int64)
+        if len(keys):
+            order = np.lexsort((ordinals, ordinals == NO_DATE, keys))
+            ordered = keys[order]
+            starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+            first[ordered[starts]] = order[starts]
+        return first
+    first = array('q', [-1]) * size
+    for n, (key, ordinal) in enumerate(zip(keys, ordinals)):
+        best = first[key]
+        if best == -1 or (ordinal != NO_DATE and (ordinals[best] == NO_DATE or ordinal < ordinals[best])):
+            first[key] = n
+    return first
+    first = array('l', [NO_DATE]) * size
+    for key, ordinal in zip(keys, ordinals):
+        if ordinal != NO_DATE and (first[key] == NO_DATE or ordinal < first[key]):
+            first[key] = ordinal
+    return first
+
+
+def _key_space(*columns):
+    """One past the largest key in `columns`."""
+    return max((int(c.max() if np is not None else max(c)) for c in columns if len(c)), default=0) + 1
+
+
+def isin(column, codes):
+    """Mask of the rows of `column` whose value is one of `codes`."""
+    if np is not None:
+        return np.isin(np.asarray(column), list(codes))
+    codes = set(codes)
+    return [value in codes for value in column]
+
+
+def _with_missing(column, missing):
+    """`column` with `missing` appended, so position -1 reads as missing."""
+    if np is not None:
+        return np.append(np.asarray(column), missing)
+    return list(column) + [missing]
+
+
+def take(column, positions):
+    """The values of `column` at `positions`."""
+    if np is not None:
+        return np.asarray(column)[positions]
+    return [column[n] for n in positions]
+
+
+def ordinal_to_date(ordinal):
+    return date.fromordinal(int(ordinal)) if ordinal != NO_DATE else None
+
+
+def _iso_date(ordinal):
+    return date.fromordinal(ordinal).isoformat() if ordinal != NO_DATE else None
+
+
+def _long_date(ordinal):
+    return date.fromordinal(ordinal).strftime("%d %B, %Y") if ordinal != NO_DATE else None
+
+
+def encode_column(keys, label):
+    """Dictionary-encode `keys` as (values, codes), labelling each distinct key once."""
+    if np is not None:
+        distinct, codes = np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+        return [label(int(key)) for key in distinct], codes.ravel()
+    distinct = {}
+    codes = array('l', (distinct.setdefault(key, len(distinct)) for key in keys))
+    return [label(key) for key in distinct], codes
+
+
+def spend_by_category(snap):
+    """[(category, quantity, spend)] for every category with purchases, highest spend first."""
+    purchases = snap.purchases
+    quantity = purchases['quantity']
+    if np is not None:
+        spend_per_row = quantity * purchases['unit_price']
+    else:
+        spend_per_row = [q * p for q, p in zip(quantity, purchases['unit_price'])]
+    size = len(snap.categories)
+    quantities = group_sum(purchases['category'], quantity, size)
+    spend = group_sum(purchases['category'], spend_per_row, size)
+    rows = [(snap.categories.values[code], int(quantities[code]), round(float(spend[code]), 2))
+            for code in range(1, size) if quantities[code]]
+    return sorted(rows, key=lambda r: r[2], reverse=True)
+
+
+def issued_by_department(snap):
+    """{department: net quantity currently issued}."""
+    issues = snap.issues
+    if np is not None:
+        net = np.where(issues['is_return'] == 0, issues['quantity'], 0)
+    else:
+        net = [q if not r else 0 for q, r in zip(issues['quantity'], issues['is_return'])]
+    totals = group_sum(issues['department'], net, len(snap.departments))
+    return {snap.departments.values[code]: int(totals[code]) for code in range(1, len(snap.departments)) if totals[code]}
+
+
+def _laptop_issues(snap, category='pc', subcategory='laptop'):
+    """Positions of the issues still out whose category contains `category` and
+    whose subcategory is `subcategory`, newest issue first."""
+    issues = snap.issues
+    category_codes = [code for code, value in enumerate(snap.categories.values) if value and category in value.lower()]
+    sub_codes = [code for code, value in enumerate(snap.subcategories.values) if value and value.lower() == subcategory]
+    in_category, in_sub = isin(issues['category'], category_codes), isin(issues['subcategory'], sub_codes)
+    if np is not None:
+        selected = np.flatnonzero(in_category & in_sub & (np.asarray(issues['is_return']) == 0))
+        return selected[np.argsort(-np.asarray(issues['id'])[selected], kind='stable')]
+    selected = [n for n, (c, s, returned) in enumerate(zip(in_category, in_sub, issues['is_return'])) if c and s and not returned]
+    return sorted(selected, key=lambda n: issues['id'][n], reverse=True)
+
+
+def _laptop_columns(snap, selected):
+    """Columns of the issues at `selected`, joined to the item's first purchase
+    and to the holder's joining date, with the policy dates counted from them."""
+    purchases, issues = snap.purchases, snap.issues
+    item_ids = take(issues['item_id'], selected)
+    staff_ids = take(issues['staff_id'], selected)
+    first_purchase = first_row_by(purchases['item_id'], purchases['date'], _key_space(purchases['item_id'], item_ids))
+    purchase_rows = take(first_purchase, item_ids)
+    # -1 (no purchase) picks the appended missing value
+    purchase_dates = take(_with_missing(purchases['date'], NO_DATE), purchase_rows)
+    joined = take(snap.staff_joined, staff_ids)
+    return {
+        'staff_id': staff_ids,
+        'staff': take(issues['staff'], selected),
+        'department': take(issues['department'], selected),
+        'date': take(issues['date'], selected),
+        'specs': take(issues['specs'], selected),
+        'serial_no': take(issues['serial_no'], selected),
+        'remarks': take(_with_missing(purchases['remarks'], 0), purchase_rows),
+        'date_of_purchase': purchase_dates,
+        'end_of_life': add_days(purchase_dates, LAPTOP_LIFE_DAYS),
+        'date_of_joining': joined,
+        'employee_eligibility': add_days(joined, LAPTOP_ELIGIBILITY_DAYS)
+    }
+
+
+def laptop_lifecycle(snap, subcategory='laptop', category='pc'):
+    """End-of-life and eligibility dates for every active laptop issue, newest first.
+
+    Laptops are issues in `subcategory` under a category containing `category`,
+    as on the laptop report. End of life is counted from the item's first
+    purchase; eligibility from the joining date of the staff member the issue
+    points at (none for issues that match no staff member). Returns a list of
+    dicts, one per issue.
+    """
+    columns = _laptop_columns(snap, _laptop_issues(snap, category, subcategory))
+    return [{
+        'staff_id': int(columns['staff_id'][k]) or None,
+        'staff': snap.staff.values[int(columns['staff'][k])],
+        'department': snap.departments.values[int(columns['department'][k])],
+        'date_of_purchase': ordinal_to_date(columns['date_of_purchase'][k]),
+        'end_of_life': ordinal_to_date(columns['end_of_life'][k]),
+        'employee_eligibility': ordinal_to_date(columns['employee_eligibility'][k])
+    } for k in range(len(columns['staff_id']))]
+
+
+# laptop report filter -> (snapshot column, dictionary it is encoded with)
+LAPTOP_TEXT_FILTERS = {
+    'Users': ('staff', 'staff'),
+    'Department': ('department', 'departments'),
+    'Specs': ('specs', 'specs'),
+    'Serial No': ('serial_no', 'serials')
+}
+
+LAPTOP_DATE_FILTERS = {
+    'Date of Purchase': 'date_of_purchase',
+    'Issue Date': 'date',
+    'Employee Joining Date': 'date_of_joining'
+}
+
+
+def laptop_report(snap, filter_by='All', filter_value='', filter_date=''):
+    """The laptop report, with the same rows and filters as reports.laptop_report_rows.
+
+    Text filters are matched once per distinct value and date filters compare
+    ordinals, so only the columns are touched; the result stays columnar.
+    """
+    columns = _laptop_columns(snap, _laptop_issues(snap))
+    keep = None
+    if filter_by in LAPTOP_TEXT_FILTERS and filter_value:
+        column, dictionary = LAPTOP_TEXT_FILTERS[filter_by]
+        needle = filter_value.lower()
+        codes = [code for code, value in enumerate(getattr(snap, dictionary).values) if value and needle in value.lower()]
+        keep = isin(columns[column], codes)
+    elif filter_by in LAPTOP_DATE_FILTERS and filter_date:
+        ordinal = _date_ordinal(filter_date)
+        keep = isin(columns[LAPTOP_DATE_FILTERS[filter_by]], [ordinal] if ordinal != NO_DATE else [])
+    if keep is not None:
+        kept = np.flatnonzero(keep) if np is not None else [n for n, k in enumerate(keep) if k]
+        columns = {name: take(column, kept) for name, column in columns.items()}
+
+    return LaptopReport({
+        'Users': encode_column(columns['staff'], snap.staff.values.__getitem__),
+        'Department': encode_column(columns['department'], snap.departments.values.__getitem__),
+        'Laptop Age Policy': ([LAPTOP_AGE_POLICY], array('l', [0]) * len(columns['staff'])),
+        'Date of Purchase': encode_column(columns['date_of_purchase'], _iso_date),
+        'End of Laptop Life': encode_column(columns['end_of_life'], _long_date),
+        'Issue Date': encode_column(columns['date'], _iso_date),
+        'Employee Joining Date': encode_column(columns['date_of_joining'], _iso_date),
+        'Employee Eligibility': encode_column(columns['employee_eligibility'], _long_date),
+        'Specs': encode_column(columns['specs'], snap.specs.values.__getitem__),
+        'Serial No': encode_column(columns['serial_no'], snap.serials.values.__getitem__),
+        'Description': encode_column(columns['remarks'], snap.remarks.values.__getitem__)
+    })
+
+
+class LaptopReport:
+    """Report rows kept as dictionary-encoded columns. Row dicts are only built
+    for the slice being shown, so a page costs the same however long the report."""
+
+    def __init__(self, columns):
+        # report column -> (distinct values, code per row)
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))[1])
+
+    def rows(self, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        return [{name: values[codes[k]] for name, (values, codes) in self.columns.items()} for k in range(start, stop)]
+
+    def dump(self, f):
+        json.dump({name: {'values': values, 'codes': codes.tolist()} for name, (values, codes) in self.columns.items()}, f)
+
+    @classmethod
+    def load(cls, f):
+        return cls({name: (column['values'], array('l', column['codes'])) for name, column in json.load(f).items()})
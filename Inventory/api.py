@@ -1,6 +1,15 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, session
 from db import get_db_connection
+import services
+import alerts
+import changes
+import search
+from admission import request_class
+from responses import compact_response, encoded_response
+from writer import write
+import staffing
 import logging
+import time
 
 # Create a Blueprint for API routes, with a URL prefix
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -8,104 +17,176 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 @api_bp.route('/get_subcategories/<int:category_id>')
 def get_subcategories(category_id):
     conn = get_db_connection()
-    subcategories = conn.execute('SELECT DISTINCT s.id, s.name FROM subcategories s WHERE s.category_id = ? ORDER BY s.name', (category_id,)).fetchall()
+    subcategories = services.get_subcategories(conn, category_id)
     conn.close()
-    return jsonify([{'id': sub['id'], 'name': sub['name']} for sub in subcategories])
+    return compact_response(subcategories)
 
 @api_bp.route('/add_category', methods=['POST'])
 def add_category():
-    try:
-        data = request.get_json()
-        category_name = data.get('name', '').strip()
-        if not category_name:
-            return jsonify({'success': False, 'message': 'Category name is required'})
-        conn = get_db_connection()
-        existing = conn.execute("SELECT id FROM categories WHERE LOWER(name) = LOWER(?)", (category_name,)).fetchone()
-        if existing:
-            conn.close()
-            return jsonify({'success': False, 'message': 'Category already exists'})
-        conn.execute("INSERT INTO categories (name) VALUES (?)", (category_name,))
-        category_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-        conn.commit()
-        conn.close()
-        return jsonify({'success': True, 'category_id': category_id, 'message': 'Category added successfully'})
-    except Exception as e:
-        logging.error(f"Error adding category: {e}")
-        return jsonify({'success': False, 'message': 'Internal server error'})
+    data = request.get_json(silent=True) or {}
+    payload, status = write(services.add_category, data.get('name', ''))
+    return jsonify(payload), status
 
 @api_bp.route('/add_subcategory', methods=['POST'])
 def add_subcategory():
-    try:
-        data = request.get_json()
-        subcategory_name = data.get('name', '').strip()
-        category_id = data.get('category_id')
-        if not subcategory_name or not category_id:
-            return jsonify({'success': False, 'message': 'Subcategory name and category are required'})
-        conn = get_db_connection()
-        existing = conn.execute("SELECT id FROM subcategories WHERE LOWER(name) = LOWER(?) AND category_id = ?", (subcategory_name, category_id)).fetchone()
-        if existing:
-            conn.close()
-            return jsonify({'success': False, 'message': 'Subcategory already exists in this category'})
-        conn.execute("INSERT INTO subcategories (name, category_id) VALUES (?, ?)", (subcategory_name, category_id))
-        subcategory_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-        conn.commit()
-        conn.close()
-        return jsonify({'success': True, 'subcategory_id': subcategory_id, 'message': 'Subcategory added successfully'})
-    except Exception as e:
-        logging.error(f"Error adding subcategory: {e}")
-        return jsonify({'success': False, 'message': 'Internal server error'})
+    data = request.get_json(silent=True) or {}
+    payload, status = write(services.add_subcategory, data.get('name', ''), data.get('category_id'))
+    return jsonify(payload), status
 
 @api_bp.route('/get_staff_by_department/<department>')
 def get_staff_by_department(department):
     try:
         conn = get_db_connection()
-        staff = conn.execute('SELECT DISTINCT name, designation FROM staff WHERE LOWER(dept) = LOWER(?) ORDER BY name', (department,)).fetchall()
+        staff = conn.execute('SELECT id, name, designation FROM staff WHERE LOWER(dept) = LOWER(?) ORDER BY name', (department,)).fetchall()
         conn.close()
-        return jsonify([{'name': s['name'], 'designation': s['designation']} for s in staff])
+        return compact_response([{'id': s['id'], 'name': s['name'], 'designation': s['designation']} for s in staff])
     except Exception as e:
         logging.error(f"Error fetching staff: {e}")
         return jsonify([]), 500
 
+@api_bp.route('/staff/<int:staff_id>/holdings')
+def get_staff_holdings(staff_id):
+    """Everything currently issued to a staff member."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    conn = get_db_connection()
+    staff = staffing.get_staff(conn, staff_id)
+    rows = staffing.holdings(conn, staff) if staff else []
+    conn.close()
+    if staff is None:
+        return jsonify({'success': False, 'message': 'Staff member not found'}), 404
+    return compact_response({'staff': dict(staff), 'holdings': rows})
+
+@api_bp.route('/staff/<int:staff_id>/history')
+def get_staff_history(staff_id):
+    """Every issue and return for a staff member, newest first."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    conn = get_db_connection()
+    staff = staffing.get_staff(conn, staff_id)
+    rows = staffing.history(conn, staff) if staff else []
+    conn.close()
+    if staff is None:
+        return jsonify({'success': False, 'message': 'Staff member not found'}), 404
+    return compact_response({'staff': dict(staff), 'history': rows})
+
 @api_bp.route('/get_departments')
 def get_departments():
     try:
         conn = get_db_connection()
         departments = conn.execute('SELECT DISTINCT dept FROM staff ORDER BY dept').fetchall()
         conn.close()
-        return jsonify([dept['dept'] for dept in departments])
+        return compact_response([dept['dept'] for dept in departments])
     except Exception as e:
         logging.error(f"Error fetching departments: {e}")
         return jsonify([]), 500
 
 @api_bp.route('/get_purchase_categories')
 def get_purchase_categories():
-    try:
-        conn = get_db_connection()
-        categories = conn.execute('SELECT DISTINCT c.id, c.name FROM categories c LEFT JOIN items i ON c.id = i.category_id LEFT JOIN purchases p ON i.id = p.item_id ORDER BY c.name').fetchall()
-        conn.close()
-        return jsonify([{'id': cat['id'], 'name': cat['name']} for cat in categories])
-    except Exception as e:
-        logging.error(f"Error fetching purchase categories: {e}")
-        return jsonify([]), 500
+    conn = get_db_connection()
+    categories = services.get_categories(conn)
+    conn.close()
+    return compact_response(categories)
 
 @api_bp.route('/get_purchase_subcategories/<int:category_id>')
 def get_purchase_subcategories(category_id):
-    try:
-        conn = get_db_connection()
-        subcategories = conn.execute('SELECT DISTINCT s.id, s.name FROM subcategories s LEFT JOIN items i ON s.id = i.subcategory_id LEFT JOIN purchases p ON i.id = p.item_id WHERE i.category_id = ? ORDER BY s.name', (category_id,)).fetchall()
-        conn.close()
-        return jsonify([{'id': sub['id'], 'name': sub['name']} for sub in subcategories])
-    except Exception as e:
-        logging.error(f"Error fetching purchase subcategories: {e}")
-        return jsonify([]), 500
+    conn = get_db_connection()
+    subcategories = services.get_subcategories(conn, category_id)
+    conn.close()
+    return compact_response(subcategories)
 
 @api_bp.route('/get_purchase_specs/<int:subcategory_id>')
 def get_purchase_specs(subcategory_id):
+    conn = get_db_connection()
+    specs = services.get_purchase_specs(conn, subcategory_id)
+    conn.close()
+    return compact_response(specs)
+
+
+@api_bp.route('/alerts')
+def get_alerts():
+    conn = get_db_connection()
+    low_stock = alerts.get_alerts(conn)
+    conn.close()
+    return compact_response({'count': len(low_stock), 'alerts': low_stock})
+
+def _set_threshold(conn, threshold, item_id, subcategory_id):
+    alerts.set_threshold(conn, threshold, item_id=item_id, subcategory_id=subcategory_id)
+    return alerts.alert_count(conn)
+
+@api_bp.route('/alerts/thresholds', methods=['POST'])
+def set_reorder_threshold():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    data = request.get_json(silent=True) or {}
+    threshold = data.get('threshold')
     try:
-        conn = get_db_connection()
-        specs = conn.execute('SELECT DISTINCT i.id, i.specs FROM items i INNER JOIN purchases p ON i.id = p.item_id WHERE i.subcategory_id = ? ORDER BY i.specs', (subcategory_id,)).fetchall()
+        threshold = int(threshold) if threshold not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Threshold must be a whole number'}), 400
+    try:
+        count = write(_set_threshold, threshold, data.get('item_id'), data.get('subcategory_id'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'count': count})
+
+
+@api_bp.route('/changes')
+@request_class('heavy')
+def get_changes():
+    """Change feed as JSON lines: /api/changes?since=<cursor>&limit=N.
+
+    The cursor to pass next time is returned in the X-Changes-Cursor header,
+    and X-Changes-More is 1 while further pages are waiting.
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', changes.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'since and limit must be integers'}), 400
+    conn = get_db_connection()
+    try:
+        records, cursor, more = changes.get_changes(conn, since, limit)
+    except changes.CursorExpired as e:
+        return jsonify({'success': False, 'message': str(e)}), 410
+    finally:
         conn.close()
-        return jsonify([{'id': spec['id'], 'specs': spec['specs']} for spec in specs])
-    except Exception as e:
-        logging.error(f"Error fetching purchase specs: {e}")
-        return jsonify([]), 500
\ No newline at end of file
+    response = encoded_response(changes.to_json_lines(records).encode('utf-8'), 'application/x-ndjson')
+    response.headers['X-Changes-Cursor'] = str(cursor)
+    response.headers['X-Changes-More'] = '1' if more else '0'
+    return response
+
+@api_bp.route('/changes/cursor')
+def get_changes_cursor():
+    """Current cursor, taken alongside a full export to start following the feed."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    conn = get_db_connection()
+    cursor = changes.current_cursor(conn)
+    conn.close()
+    return jsonify({'cursor': cursor})
+
+@api_bp.route('/autocomplete')
+@request_class('interactive')
+def autocomplete():
+    """Typo-tolerant matches: /api/autocomplete?type=staff|specs|serial&q=...&limit=N.
+
+    Optional filters: department (staff), subcategory_id (specs, serial) and
+    item_id (serial). With a filter, an empty q lists the matches by name.
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    started = time.perf_counter()
+    try:
+        results = search.autocomplete(request.args.get('type', ''), request.args.get('q', ''),
+                                      request.args.get('limit', search.DEFAULT_LIMIT),
+                                      department=request.args.get('department'),
+                                      subcategory_id=request.args.get('subcategory_id'),
+                                      item_id=request.args.get('item_id'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    response = compact_response(results)
+    response.headers['Server-Timing'] = f'search;dur={(time.perf_counter() - started) * 1000:.3f}'
+    return response
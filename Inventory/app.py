@@ -5,6 +5,18 @@ from datetime import datetime, timedelta  # <-- Add timedelta import
 from routes import main_bp
 from api import api_bp
 from auth import auth_bp
+from jobs import jobs_bp
+from events import events_bp
+from maintenance import maintenance_bp, start_scheduler
+from db import init_db, get_db_connection
+from alerts import init_alerts, inject_alert_count
+from catalog import migrate_item_keys
+from staffing import migrate_issue_staff
+from sites import sites_bp, init_sites
+from changes import init_changes
+import search
+from assets import init_assets
+from admission import init_admission
 import os
 
 # --- 1. DEFINE THE FORMATTING FUNCTION ---
@@ -54,14 +66,34 @@ def create_app():
     except OSError:
         pass
 
+    init_db()
+    conn = get_db_connection()
+    init_alerts(conn)
+    migrate_item_keys(conn)
+    migrate_issue_staff(conn)
+    init_sites(conn)
+    init_changes(conn)
+    conn.close()
+    # build the autocomplete indexes now rather than on the first keystroke
+    search.indexes.refresh()
+    app.context_processor(inject_alert_count)
+
     # Register blueprints
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(maintenance_bp)
+    app.register_blueprint(sites_bp)
+    init_assets(app)
+    init_admission(app)
 
     return app
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    start_scheduler()
+    # Development server only; production runs through wsgi.py under gunicorn.
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
 
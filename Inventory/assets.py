@@ -0,0 +1,138 @@
+from flask import Blueprint, current_app, send_file, url_for, abort
+from responses import accepted_encodings
+import mimetypes
+import hashlib
+import gzip
+import re
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Build-free asset pipeline. At startup every file under static/ is hashed and
+# given a fingerprinted name (css/base.3f2a91c0d4.css). Text assets are
+# precompressed into the instance folder, and everything is served from
+# /assets/ with a one-year immutable cache lifetime, so a repeat page load
+# only re-fetches files whose content actually changed.
+
+assets_bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.html'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CSS_URL = re.compile(r'url\((["\']?)([^"\')]+)\1\)')
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+
+def _fingerprint(logical, digest):
+    base, ext = os.path.splitext(logical)
+    return f'{base}.{digest[:10]}{ext}'
+
+
+def _rewrite_css_urls(css, logical, manifest):
+    """Point url(...) references in a stylesheet at the fingerprinted files."""
+    css_dir = os.path.dirname(logical)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        path, sep, suffix = target.partition('?')
+        if not sep:
+            path, sep, suffix = target.partition('#')
+        resolved = os.path.normpath(os.path.join(css_dir, path)).replace(os.sep, '/')
+        if resolved not in manifest:
+            return match.group(0)
+        relative = os.path.relpath(manifest[resolved], css_dir or '.').replace(os.sep, '/')
+        return f'url({quote}{relative}{sep}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, css)
+
+
+def _write_once(path, data):
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+def build_manifest(static_folder, cache_dir):
+    """Fingerprint and precompress every file under `static_folder`.
+
+    Returns (manifest, files): manifest maps logical names to fingerprinted
+    names, files maps fingerprinted names to {encoding: path on disk}.
+    """
+    logical_names = []
+    for root, dirs, filenames in os.walk(static_folder):
+        # uploads/ holds user files saved at runtime, not versioned assets
+        dirs[:] = [d for d in dirs if not (root == static_folder and d == 'uploads')]
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            logical_names.append(os.path.relpath(path, static_folder).replace(os.sep, '/'))
+
+    # Stylesheets go last so the files they reference are already fingerprinted.
+    logical_names.sort(key=lambda name: (name.endswith('.css'), name))
+
+    manifest = {}
+    files = {}
+    for logical in logical_names:
+        source = os.path.join(static_folder, logical)
+        with open(source, 'rb') as f:
+            data = f.read()
+        if logical.endswith('.css'):
+            data = _rewrite_css_urls(data.decode('utf-8'), logical, manifest).encode('utf-8')
+
+        fingerprinted = _fingerprint(logical, hashlib.sha256(data).hexdigest())
+        manifest[logical] = fingerprinted
+        variants = {'identity': source}
+
+        if logical.endswith('.css'):
+            variants['identity'] = os.path.join(cache_dir, fingerprinted)
+            _write_once(variants['identity'], data)
+
+        if os.path.splitext(logical)[1] in COMPRESSIBLE:
+            variants['gzip'] = os.path.join(cache_dir, fingerprinted + '.gz')
+            _write_once(variants['gzip'], gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                variants['br'] = os.path.join(cache_dir, fingerprinted + '.br')
+                _write_once(variants['br'], brotli.compress(data))
+
+        files[fingerprinted] = variants
+    return manifest, files
+
+
+def asset_url(filename):
+    """Template helper: URL of the fingerprinted copy of a static file."""
+    manifest, _ = current_app.extensions['assets']
+    if filename not in manifest:
+        return url_for('static', filename=filename)
+    return url_for('assets.serve_asset', filename=manifest[filename])
+
+
+@assets_bp.route('/<path:filename>')
+def serve_asset(filename):
+    _, files = current_app.extensions['assets']
+    variants = files.get(filename)
+    if variants is None:
+        abort(404)
+
+    encoding = next((e for e in accepted_encodings() if e in variants), 'identity')
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(variants[encoding], mimetype=mimetype, etag=f'{filename}-{encoding}', conditional=True)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    if len(variants) > 1:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def init_assets(app):
+    cache_dir = os.path.join(app.instance_path, 'assets')
+    app.extensions['assets'] = build_manifest(app.static_folder, cache_dir)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.register_blueprint(assets_bp)
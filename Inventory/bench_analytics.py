@@ -0,0 +1,86 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import analytics
+import reports
+from bench_queries import build_database
+
+# Memory held by the laptop report before (a dict of strings per row, from
+# reports.laptop_report_rows) and after (the columnar snapshot and the
+# dictionary-encoded LaptopReport), both while the job builds it and in the
+# web worker that loads the job result to render a page.
+# Usage: python bench_analytics.py [purchases] [issues]
+
+N_STAFF = 500
+
+
+def make_laptop_history(conn):
+    """Turn the bench_queries database into a laptop-heavy history: every item a
+    laptop, every issue held by a staff member, with specs, serials and remarks."""
+    conn.execute('ALTER TABLE issues ADD COLUMN staff_id INTEGER')
+    conn.execute("UPDATE categories SET name = 'PC ' || name")
+    conn.execute("UPDATE subcategories SET name = 'Laptop'")
+    conn.executemany('INSERT INTO staff (dept, name, designation, date_of_joining) VALUES (?, ?, ?, ?)',
+                     [(f'Dept {n % 25}', f'Staff {n}', 'Engineer', f'20{10 + n % 14}-0{1 + n % 9}-15') for n in range(N_STAFF)])
+    conn.execute(f'''
+        UPDATE issues SET staff_id = id % {N_STAFF} + 1, staff_name = 'Staff ' || (id % {N_STAFF}),
+               department = 'Dept ' || (id % {N_STAFF} % 25), specs = 'Spec ' || (id % 50), serial_no = 'SN-' || id
+    ''')
+    conn.execute("UPDATE purchases SET remarks = 'Remarks ' || (id % 40), date = DATE('2020-01-01', '+' || (id % 1500) || ' days')")
+    conn.commit()
+
+
+def measure(build):
+    """(result, bytes still held by it, peak bytes while building it, seconds)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, peak, elapsed
+
+
+def report_line(name, rows, held, peak, elapsed):
+    per_row = held / rows if rows else 0
+    print(f'{name:<28}{rows:>10}{held / 2**20:>11.1f}{peak / 2**20:>11.1f}{per_row:>10.0f}{elapsed * 1000:>10.0f}')
+
+
+def main(n_purchases=200000, n_issues=100000):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, 'bench.db'), n_purchases, n_issues)
+        conn.row_factory = sqlite3.Row
+        make_laptop_history(conn)
+        print(f'{n_purchases} purchases, {n_issues} issues, numpy {"on" if analytics.np is not None else "off"}')
+        print(f"{'':<28}{'rows':>10}{'held MiB':>11}{'peak MiB':>11}{'B/row':>10}{'ms':>10}")
+
+        rows, held, peak, elapsed = measure(lambda: reports.laptop_report_rows(conn))
+        report_line('job: dict rows (before)', len(rows), held, peak, elapsed)
+        old_result = json.dumps(rows)
+        del rows
+
+        snap, held, peak, elapsed = measure(lambda: analytics.load_snapshot(conn))
+        report_line('job: snapshot', len(snap.purchases) + len(snap.issues), held, peak, elapsed)
+        report, held, peak, elapsed = measure(lambda: analytics.laptop_report(snap))
+        report_line('job: columnar report (after)', len(report), held, peak, elapsed)
+        new_result = io.StringIO()
+        report.dump(new_result)
+        del snap
+
+        rows, held, peak, elapsed = measure(lambda: json.loads(old_result))
+        report_line('page: load dicts (before)', len(rows), held, peak, elapsed)
+        del rows
+        new_result.seek(0)
+        report, held, peak, elapsed = measure(lambda: analytics.LaptopReport.load(new_result))
+        report_line('page: load columns (after)', len(report), held, peak, elapsed)
+        conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,108 @@
+import sqlite3
+import random
+import tempfile
+import time
+import os
+
+import services
+from catalog import ITEM_KEY_INDEX, specs_key
+from db import INDEXES
+
+# Compares the old route/API query shapes against the shared service queries
+# on a synthetic database.  Usage: python bench_queries.py [purchases] [issues]
+
+SCHEMA = '''
+CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+CREATE TABLE subcategories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, category_id INTEGER NOT NULL);
+CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, category_id INTEGER, subcategory_id INTEGER, specs TEXT, remarks TEXT, specs_key TEXT);
+CREATE TABLE staff (id INTEGER PRIMARY KEY AUTOINCREMENT, dept TEXT NOT NULL, name TEXT NOT NULL, designation TEXT NOT NULL, date_of_joining TEXT);
+CREATE TABLE purchases (id INTEGER PRIMARY KEY AUTOINCREMENT, item_id INTEGER, vendor TEXT, unit_price REAL NOT NULL, quantity INTEGER NOT NULL,
+    total_price REAL, date TEXT, remarks TEXT, bill_id INTEGER, serial_no TEXT, bill_image TEXT);
+CREATE TABLE issues (id INTEGER PRIMARY KEY AUTOINCREMENT, dept_id INTEGER, item_id INTEGER, quantity INTEGER NOT NULL, date TEXT, specs TEXT,
+    remarks TEXT, department TEXT, staff_name TEXT, item_name TEXT, category TEXT, subcategory TEXT, is_return INTEGER DEFAULT 0,
+    return_reason TEXT, return_date TEXT, serial_no TEXT);
+'''
+
+OLD_QUERIES = {
+    'purchase_categories': ('SELECT DISTINCT c.id, c.name FROM categories c LEFT JOIN items i ON c.id = i.category_id LEFT JOIN purchases p ON i.id = p.item_id ORDER BY c.name', ()),
+    'purchase_subcategories': ('SELECT DISTINCT s.id, s.name FROM subcategories s LEFT JOIN items i ON s.id = i.subcategory_id LEFT JOIN purchases p ON i.id = p.item_id WHERE i.category_id = ? ORDER BY s.name', (1,)),
+    'purchase_specs': ('''
+        SELECT DISTINCT i.id as id, TRIM(i.specs) as specs
+        FROM items i
+        JOIN purchases p ON i.id = p.item_id
+        WHERE i.subcategory_id = ?
+          AND i.specs IS NOT NULL
+          AND TRIM(i.specs) <> ''
+          AND TRIM(i.specs) <> '-'
+        ORDER BY i.specs
+    ''', (1,)),
+    'stock_summary': ('''
+        WITH all_categories AS (SELECT DISTINCT c.name as category, s.name as subcategory FROM items i LEFT JOIN categories c ON i.category_id = c.id LEFT JOIN subcategories s ON i.subcategory_id = s.id WHERE c.name IS NOT NULL AND s.name IS NOT NULL),
+        purchase_totals AS (SELECT c.name as category, s.name as subcategory, COALESCE(SUM(p.quantity), 0) as total_purchased FROM items i LEFT JOIN categories c ON i.category_id = c.id LEFT JOIN subcategories s ON i.subcategory_id = s.id LEFT JOIN purchases p ON i.id = p.item_id WHERE c.name IS NOT NULL AND s.name IS NOT NULL GROUP BY c.name, s.name),
+        issue_totals AS (SELECT c.name as category, s.name as subcategory, COALESCE(SUM(CASE WHEN iss.is_return = 0 THEN iss.quantity ELSE 0 END), 0) as total_issued FROM items i LEFT JOIN categories c ON i.category_id = c.id LEFT JOIN subcategories s ON i.subcategory_id = s.id LEFT JOIN issues iss ON i.id = iss.item_id WHERE c.name IS NOT NULL AND s.name IS NOT NULL GROUP BY c.name, s.name)
+        SELECT ac.category, ac.subcategory, COALESCE(pt.total_purchased, 0) as total_purchased, COALESCE(it.total_issued, 0) as total_issued, COALESCE(pt.total_purchased, 0) - COALESCE(it.total_issued, 0) as stock_available
+        FROM all_categories ac LEFT JOIN purchase_totals pt ON ac.category = pt.category AND ac.subcategory = pt.subcategory LEFT JOIN issue_totals it ON ac.category = it.category AND ac.subcategory = it.subcategory ORDER BY ac.category, ac.subcategory
+    ''', ()),
+}
+
+NEW_QUERIES = {
+    'purchase_categories': (services.CATEGORIES_SQL, ()),
+    'purchase_subcategories': (services.SUBCATEGORIES_SQL, (1,)),
+    'purchase_specs': (services.PURCHASE_SPECS_SQL, (1,)),
+    'stock_summary': (services.STOCK_SUMMARY_SQL, ()),
+}
+
+
+def build_database(path, n_purchases, n_issues, n_categories=20, n_subcategories=10, n_items=2000):
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany('INSERT INTO categories (name) VALUES (?)', [(f'Category {c}',) for c in range(n_categories)])
+    conn.executemany('INSERT INTO subcategories (name, category_id) VALUES (?, ?)',
+                     [(f'Sub {s}', c + 1) for c in range(n_categories) for s in range(n_subcategories)])
+    n_subs = n_categories * n_subcategories
+    # one row per canonical (category, subcategory, specs_key), as catalog.py enforces
+    items = {}
+    while len(items) < n_items:
+        sub_id = rng.randint(1, n_subs)
+        specs = rng.choice(['-', '', None, f'Spec {rng.randint(1, 50)}'])
+        key = ((sub_id - 1) // n_subcategories + 1, sub_id, specs_key(specs))
+        items.setdefault(key, specs)
+    conn.executemany('INSERT INTO items (category_id, subcategory_id, specs_key, specs) VALUES (?, ?, ?, ?)',
+                     [key + (specs,) for key, specs in items.items()])
+    conn.execute(f'CREATE UNIQUE INDEX {ITEM_KEY_INDEX} ON items (category_id, subcategory_id, specs_key)')
+    conn.executemany('INSERT INTO purchases (item_id, vendor, unit_price, quantity, date) VALUES (?, ?, ?, ?, ?)',
+                     [(rng.randint(1, n_items), f'Vendor {rng.randint(1, 30)}', 100.0, rng.randint(1, 10), '2025-01-01') for _ in range(n_purchases)])
+    conn.executemany('INSERT INTO issues (item_id, quantity, date, is_return) VALUES (?, ?, ?, ?)',
+                     [(rng.randint(1, n_items), 1, '2025-02-01', rng.random() < 0.1) for _ in range(n_issues)])
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+
+def time_query(conn, sql, params, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(rows)
+
+
+def main(n_purchases=200000, n_issues=100000):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, 'bench.db'), n_purchases, n_issues)
+        print(f'{n_purchases} purchases, {n_issues} issues')
+        print(f"{'query':<24}{'old ms':>10}{'new ms':>10}{'old rows':>10}{'new rows':>10}")
+        for name in OLD_QUERIES:
+            old_time, old_rows = time_query(conn, *OLD_QUERIES[name])
+            new_time, new_rows = time_query(conn, *NEW_QUERIES[name])
+            print(f'{name:<24}{old_time * 1000:>10.2f}{new_time * 1000:>10.2f}{old_rows:>10}{new_rows:>10}')
+        conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,46 @@
+import random
+import time
+
+import responses
+
+# Compares payload size and encode time of the response formats on synthetic
+# serial-lookup rows.  Usage: python bench_responses.py [rows]
+
+
+def build_rows(n_rows):
+    random.seed(7)
+    return [{
+        'id': i,
+        'serial_no': f'SN-{random.randrange(10 ** 9):09d}',
+        'item_id': random.randrange(1, 2000),
+        'specs': random.choice(['i5 8GB 256GB SSD', 'i7 16GB 512GB SSD', '24in IPS', 'A4 mono laser']),
+        'date': f'2024-{random.randrange(1, 13):02d}-{random.randrange(1, 29):02d}',
+    } for i in range(n_rows)]
+
+
+def time_encode(rows, mimetype, coding, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = responses.encode(rows, mimetype)
+        if coding:
+            body = responses.compress(body, coding)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+
+def main(n_rows=50000):
+    rows = build_rows(n_rows)
+    codings = [None, 'gzip'] + (['br'] if responses.brotli is not None else [])
+    print(f'{n_rows} rows')
+    print(f"{'format':<44}{'coding':>8}{'ms':>10}{'bytes':>12}")
+    for mimetype in responses.available_formats():
+        for coding in codings:
+            elapsed, size = time_encode(rows, mimetype, coding)
+            print(f'{mimetype:<44}{coding or "-":>8}{elapsed * 1000:>10.2f}{size:>12}')
+
+
+if __name__ == '__main__':
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:2]])
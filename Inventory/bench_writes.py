@@ -0,0 +1,65 @@
+import threading
+import tempfile
+import sqlite3
+import time
+import os
+
+import db
+import writer
+
+# Compares one-commit-per-request writes against the group-committing writer
+# with concurrent request threads.  Usage: python bench_writes.py [threads] [writes_per_thread]
+
+SCHEMA = 'CREATE TABLE staff (id INTEGER PRIMARY KEY AUTOINCREMENT, dept TEXT NOT NULL, name TEXT NOT NULL, designation TEXT NOT NULL, date_of_joining TEXT)'
+INSERT_SQL = 'INSERT INTO staff (dept, name, designation) VALUES (?, ?, ?)'
+
+
+def direct_write(n):
+    conn = sqlite3.connect(db.DATABASE, timeout=30)
+    conn.execute(INSERT_SQL, ('Bench', f'direct {n}', 'Tester'))
+    conn.commit()
+    conn.close()
+
+
+def queued_write(n):
+    writer.execute(INSERT_SQL, ('Bench', f'queued {n}', 'Tester'))
+
+
+def run(write_one, n_threads, n_writes):
+    errors = []
+
+    def worker(t):
+        for i in range(n_writes):
+            try:
+                write_one(t * n_writes + i)
+            except sqlite3.Error as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(errors)
+
+
+def main(n_threads=16, n_writes=50):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(db.DATABASE)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(SCHEMA)
+        conn.close()
+        total = n_threads * n_writes
+        print(f'{n_threads} threads x {n_writes} writes')
+        print(f"{'mode':<10}{'seconds':>10}{'writes/s':>12}{'errors':>8}")
+        for name, write_one in (('direct', direct_write), ('writer', queued_write)):
+            elapsed, errors = run(write_one, n_threads, n_writes)
+            print(f'{name:<10}{elapsed:>10.3f}{total / elapsed:>12.0f}{errors:>8}')
+        print(writer.writer.stats())
+
+
+if __name__ == '__main__':
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:3]])
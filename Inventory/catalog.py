@@ -0,0 +1,133 @@
+import threading
+import logging
+
+from alerts import evaluate_items
+
+# Canonical item resolution. An item is identified by (category, subcategory,
+# specs_key), where specs_key is the specs text with whitespace collapsed,
+# case folded and the '-'/empty/NULL "no specs" sentinels mapped to ''. A
+# unique index on that key stops duplicate items, and a per-process cache
+# maps keys to item ids so repeat lookups skip the query entirely.
+
+ITEM_KEY_INDEX = 'idx_items_canonical_key'
+
+FIND_ITEM_SQL = 'SELECT id FROM items WHERE category_id = ? AND subcategory_id = ? AND specs_key = ?'
+
+INSERT_ITEM_SQL = '''
+    INSERT INTO items (category_id, subcategory_id, specs, specs_key) VALUES (?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+'''
+
+RESOLVER_CACHE_SIZE = 10000
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def clean_specs(specs):
+    """Display form of specs: whitespace collapsed, sentinels mapped to None."""
+    if specs is None:
+        return None
+    cleaned = ' '.join(str(specs).split())
+    return cleaned if cleaned.strip('-') else None
+
+
+def specs_key(specs):
+    """Comparison key for specs; '' means the item has no specs."""
+    cleaned = clean_specs(specs)
+    return cleaned.casefold() if cleaned else ''
+
+
+def item_key(category_id, subcategory_id, specs):
+    return (int(category_id), int(subcategory_id), specs_key(specs))
+
+
+def resolve_item(conn, category_id, subcategory_id, specs, create=True):
+    """Return the item id for (category, subcategory, specs), creating it if needed.
+
+    Returns None when the item does not exist and `create` is False. Ids are
+    only cached once they are known to be committed, so a rolled-back insert
+    can never leave a stale entry behind: inside a writer job they are cached
+    after the group commits, and in other open transactions not at all.
+    """
+    key = item_key(category_id, subcategory_id, specs)
+    item_id = _cache.get(key)
+    if item_id is not None:
+        return item_id
+
+    row = conn.execute(FIND_ITEM_SQL, key).fetchone()
+    if row is None:
+        if not create:
+            return None
+        conn.execute(INSERT_ITEM_SQL, (key[0], key[1], clean_specs(specs), key[2]))
+        row = conn.execute(FIND_ITEM_SQL, key).fetchone()
+
+    if not conn.in_transaction:
+        _remember(key, row['id'])
+    elif hasattr(conn, 'after_commit'):
+        conn.after_commit(lambda: _remember(key, row['id']))
+    return row['id']
+
+
+def _remember(key, item_id):
+    with _cache_lock:
+        if len(_cache) >= RESOLVER_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = item_id
+
+
+def clear_resolver_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _has_column(conn, table, column):
+    return any(r[1] == column for r in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def migrate_item_keys(conn):
+    """One-time migration: add specs_key, merge duplicate items, add the unique index.
+
+    Purchases, issues, thresholds and alerts that pointed at a duplicate are
+    moved onto the surviving (lowest id) item. Safe to call on every startup;
+    it does nothing once the unique index exists.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (ITEM_KEY_INDEX,)).fetchone():
+        return 0
+
+    if not _has_column(conn, 'items', 'specs_key'):
+        conn.execute('ALTER TABLE items ADD COLUMN specs_key TEXT')
+    rows = conn.execute('SELECT id, category_id, subcategory_id, specs FROM items ORDER BY id').fetchall()
+    conn.executemany('UPDATE items SET specs_key = ? WHERE id = ?', [(specs_key(r['specs']), r['id']) for r in rows])
+
+    survivors = {}
+    merges = []
+    for r in rows:
+        key = (r['category_id'], r['subcategory_id'], specs_key(r['specs']))
+        if r['category_id'] is None or r['subcategory_id'] is None:
+            continue
+        if key in survivors:
+            merges.append((survivors[key], r['id']))
+        else:
+            survivors[key] = r['id']
+
+    for survivor, duplicate in merges:
+        conn.execute('UPDATE purchases SET item_id = ? WHERE item_id = ?', (survivor, duplicate))
+        conn.execute('UPDATE issues SET item_id = ? WHERE item_id = ?', (survivor, duplicate))
+        if conn.execute('SELECT 1 FROM reorder_thresholds WHERE item_id = ?', (survivor,)).fetchone():
+            conn.execute('DELETE FROM reorder_thresholds WHERE item_id = ?', (duplicate,))
+        else:
+            conn.execute('UPDATE reorder_thresholds SET item_id = ? WHERE item_id = ?', (survivor, duplicate))
+        conn.execute('DELETE FROM stock_alerts WHERE item_id = ?', (duplicate,))
+        conn.execute('DELETE FROM items WHERE id = ?', (duplicate,))
+
+    # Keep the display text tidy as well; survivors keep their original wording.
+    conn.executemany('UPDATE items SET specs = ? WHERE id = ?', [(clean_specs(r['specs']), r['id']) for r in rows
+                                                                if r['specs'] != clean_specs(r['specs'])])
+    conn.execute(f'CREATE UNIQUE INDEX {ITEM_KEY_INDEX} ON items (category_id, subcategory_id, specs_key)')
+    evaluate_items(conn, {survivor for survivor, _ in merges})
+    conn.commit()
+    clear_resolver_cache()
+    if merges:
+        logging.info(f'Merged {len(merges)} duplicate items onto {len(set(s for s, _ in merges))} canonical items')
+    return len(merges)
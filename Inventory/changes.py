@@ -0,0 +1,125 @@
+import json
+
+# Change feed for downstream sync. Triggers on the tracked tables append one
+# changelog row per insert, update or delete, so every write path is covered
+# without touching it. The changelog version is the feed cursor: consumers
+# pass the last version they saw and get only the rows changed since.
+# Consumers should bootstrap from a full export (download_purchases) and then
+# follow the feed from the cursor current at that time. Categories and
+# subcategories are tracked too: their names appear on every report row and
+# search result, so a rename has to move the cursor like any other write.
+
+TRACKED_TABLES = ['purchases', 'issues', 'items', 'staff', 'categories', 'subcategories']
+OPERATIONS = ['insert', 'update', 'delete']
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+RETENTION_DAYS = 30
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS changelog (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_changelog_changed_at ON changelog (changed_at)',
+]
+
+CHANGES_SQL = 'SELECT version, table_name, row_id, op FROM changelog WHERE version > ? ORDER BY version LIMIT ?'
+
+OLDEST_VERSION_SQL = '''
+    SELECT COALESCE((SELECT MIN(version) FROM changelog),
+                    (SELECT seq + 1 FROM sqlite_sequence WHERE name = 'changelog'), 1)
+'''
+
+
+class CursorExpired(Exception):
+    """The requested cursor is older than the retained changelog."""
+
+
+def _trigger_sql(table, op):
+    ref = 'OLD' if op == 'delete' else 'NEW'
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS changelog_{table}_{op} AFTER {op.upper()} ON {table}
+        BEGIN
+            INSERT INTO changelog (table_name, row_id, op) VALUES ('{table}', {ref}.id, '{op}');
+        END
+    '''
+
+
+def init_changes(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for table in TRACKED_TABLES:
+        for op in OPERATIONS:
+            conn.execute(_trigger_sql(table, op))
+    conn.commit()
+
+
+def current_cursor(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM changelog").fetchone()[0]
+
+
+def get_changes(conn, since=0, limit=DEFAULT_LIMIT):
+    """Changes after version `since`. Returns (records, cursor, more).
+
+    Several changes to the same row within one page collapse into a single
+    record carrying the row's current state (None once deleted), so a burst
+    of edits costs one record rather than one per edit. Pass `cursor` as
+    `since` on the next call; `more` says whether another page is waiting.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    since = max(0, int(since))
+    if since + 1 < conn.execute(OLDEST_VERSION_SQL).fetchone()[0]:
+        raise CursorExpired(f'Cursor {since} is older than the retained change history')
+
+    log = conn.execute(CHANGES_SQL, (since, limit + 1)).fetchall()
+    more = len(log) > limit
+    log = log[:limit]
+    if not log:
+        return [], since, False
+
+    latest = {}
+    for entry in log:
+        key = (entry['table_name'], entry['row_id'])
+        first_op = latest[key]['first_op'] if key in latest else entry['op']
+        latest[key] = {'version': entry['version'], 'op': entry['op'], 'first_op': first_op}
+
+    rows = {}
+    by_table = {}
+    for table, row_id in latest:
+        by_table.setdefault(table, []).append(row_id)
+    for table, row_ids in by_table.items():
+        for start in range(0, len(row_ids), 500):
+            chunk = row_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', chunk):
+                rows[(table, row['id'])] = dict(row)
+
+    records = []
+    for (table, row_id), change in sorted(latest.items(), key=lambda kv: kv[1]['version']):
+        op = change['op']
+        if op == 'update' and change['first_op'] == 'insert':
+            op = 'insert'
+        records.append({
+            'v': change['version'],
+            'table': table,
+            'id': row_id,
+            'op': op,
+            'row': None if op == 'delete' else rows.get((table, row_id)),
+        })
+    return records, log[-1]['version'], more
+
+
+def to_json_lines(records):
+    return ''.join(json.dumps(r, separators=(',', ':'), default=str) + '\n' for r in records)
+
+
+def prune_changes(conn, retention_days=RETENTION_DAYS):
+    """Drop changelog entries older than `retention_days`; consumers further behind must re-export."""
+    deleted = conn.execute("DELETE FROM changelog WHERE changed_at < datetime('now', ?)",
+                           (f'-{int(retention_days)} days',)).rowcount
+    conn.commit()
+    return {'deleted': deleted, 'oldest_version': conn.execute(OLDEST_VERSION_SQL).fetchone()[0]}
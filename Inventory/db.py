@@ -1,7 +1,26 @@
 import sqlite3
 
+DATABASE = 'inventory.db'
+
+# Indexes backing the item_id/category lookups used across the app.
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_purchases_item_id ON purchases (item_id)',
+    'CREATE INDEX IF NOT EXISTS idx_issues_item_id ON issues (item_id)',
+    'CREATE INDEX IF NOT EXISTS idx_items_subcategory_id ON items (subcategory_id)',
+    'CREATE INDEX IF NOT EXISTS idx_items_category_id ON items (category_id)',
+    'CREATE INDEX IF NOT EXISTS idx_subcategories_category_id ON subcategories (category_id)',
+]
+
 def get_db_connection():
     """Helper function to connect to the SQLite database."""
-    conn = sqlite3.connect('inventory.db')
+    conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
-    return conn
\ No newline at end of file
+    return conn
+
+def init_db():
+    """Create any missing indexes. Safe to run on every startup."""
+    conn = get_db_connection()
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
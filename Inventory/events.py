@@ -0,0 +1,150 @@
+from flask import Blueprint, Response, session
+from db import get_db_connection
+from admission import request_class
+from alerts import alert_count
+import services
+import changes
+import threading
+import logging
+import queue
+import json
+import time
+import os
+
+# Server-sent events for live stock/issue/purchase updates. Writes can land in
+# any worker process, so instead of being told about them each worker follows
+# the changelog (as search.py does) and turns new purchase and issue rows into
+# small JSON patches for every open /events stream it holds; the page updates
+# its tables in place instead of reloading them.
+
+events_bp = Blueprint('events', __name__)
+
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_BACKLOG = 100
+POLL_SECONDS = float(os.environ.get('INVENTORY_EVENTS_POLL', 1))
+
+
+class Broadcaster:
+    """Fans each published event out to every subscriber queue."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event, data):
+        message = f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # A stalled client should not hold up the writer; it will
+                # reload the page when it reconnects.
+                logging.warning('Dropping live update for a slow event subscriber')
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+broadcaster = Broadcaster()
+
+
+class ChangeFeed:
+    """Publishes committed purchase, issue and alert changes from every worker to this one's subscribers."""
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self._lock = threading.Lock()
+        self._pid = None
+        self.cursor = None
+        self.alerts = None
+
+    def ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own on first subscribe.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.cursor = None
+                threading.Thread(target=self._run, name='inventory-events', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(POLL_SECONDS)
+            try:
+                conn = get_db_connection()
+                try:
+                    self.poll(conn)
+                finally:
+                    conn.close()
+            except Exception as e:
+                logging.error(f"Live update poll failed: {e}")
+
+    def poll(self, conn):
+        if self.cursor is None or not len(self.broadcaster):
+            # nobody to tell about what happened in between
+            self.cursor = changes.current_cursor(conn)
+            self.alerts = alert_count(conn)
+            return
+        log = conn.execute(changes.CHANGES_SQL, (self.cursor, changes.MAX_LIMIT)).fetchall()
+        if log:
+            self.cursor = log[-1]['version']
+            self._publish_rows(conn, 'purchases', 'purchase', services.get_purchase_rows, log)
+            self._publish_rows(conn, 'issues', 'issue', services.get_issue_rows, log)
+        count = alert_count(conn)
+        if count != self.alerts:
+            self.alerts = count
+            self.broadcaster.publish('alerts', {'count': count})
+
+    def _publish_rows(self, conn, table, event, get_rows, log):
+        row_ids = sorted({e['row_id'] for e in log if e['table_name'] == table and e['op'] != 'delete'})
+        if not row_ids:
+            return
+        rows = get_rows(conn, row_ids)
+        if not rows:
+            return
+        placeholders = ', '.join('?' * len(row_ids))
+        item_ids = [r[0] for r in conn.execute(
+            f'SELECT DISTINCT item_id FROM {table} WHERE id IN ({placeholders})', row_ids)]
+        self.broadcaster.publish(event, {'rows': rows})
+        self.broadcaster.publish('stock', services.stock_changes(conn, item_ids))
+
+
+feed = ChangeFeed(broadcaster)
+
+
+@events_bp.route('/events')
+@request_class('stream')
+def stream():
+    if 'user_id' not in session:
+        # 204 tells EventSource not to reconnect
+        return Response(status=204)
+
+    feed.ensure_started()
+
+    def generate():
+        q = broadcaster.subscribe()
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield q.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+
+# Run from the Inventory directory: gunicorn -c gunicorn.conf.py wsgi:app
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('INVENTORY_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('INVENTORY_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers: each open /events stream holds a thread, not a whole worker.
+# Every worker follows the changelog for live updates (events.py), so a write
+# handled by one worker still reaches streams held open by the others.
+worker_class = 'gthread'
+threads = int(os.environ.get('INVENTORY_THREADS', 8))
+# admission.py derives its per-class limits from INVENTORY_THREADS, keeping
+# a share of the threads for interactive requests.
+timeout = int(os.environ.get('INVENTORY_TIMEOUT', 60))
+
+# Import the app and warm its caches once in the master; workers then share
+# those pages copy-on-write instead of each starting cold.
+preload_app = True
+
+loglevel = os.environ.get('INVENTORY_LOGLEVEL', 'info')
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # The master may have touched the background job pool while warming up;
+    # a fresh one is created lazily in each worker.
+    import jobs
+    jobs._executor = None
+
+    # Threads do not survive fork, so each worker starts its own scheduler;
+    # maintenance_runs ensures a due task is only run by one of them.
+    from maintenance import start_scheduler
+    start_scheduler()
@@ -0,0 +1,267 @@
+from flask import Blueprint, jsonify, request, url_for, send_file, current_app
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from db import get_db_connection
+from admission import request_class
+from writer import write, execute
+from reports import write_purchases_csv
+from services import stock_summary
+import analytics
+import changes
+import multiprocessing
+import threading
+import hashlib
+import logging
+import json
+import uuid
+import os
+
+# Background jobs for long reports and exports. Jobs run in a small process
+# pool so a big export never ties up a web worker; their state lives in the
+# `jobs` table and their output is written to disk until it expires.
+# Identical requests share a job only while the data is unchanged: the dedupe
+# hash includes the changelog cursor, so any write starts a fresh job.
+# Job bookkeeping goes through the writer like every other write, both in the
+# web worker and in the pool processes.
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+MAX_WORKERS = 2
+RESULT_TTL = timedelta(hours=1)
+# queued/running jobs older than this were lost with their worker
+STALE_AFTER = timedelta(minutes=30)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _export_purchases(conn, params, path, progress):
+    write_purchases_csv(conn, path, params.get('start_date', ''), params.get('end_date', ''), progress)
+
+
+def _laptop_report(conn, params, path, progress):
+    report = analytics.laptop_report(analytics.load_snapshot(conn), params.get('filter_by', 'All'),
+                                     params.get('filter_value', ''), params.get('filter_date', ''))
+    with open(path, 'w', encoding='utf-8') as f:
+        report.dump(f)
+
+
+def _stock_summary(conn, params, path, progress):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stock_summary(conn), f)
+
+
+def _spend_by_category(conn, params, path, progress):
+    snapshot = analytics.load_snapshot(conn)
+    rows = [{'category': c, 'quantity': q, 'spend': s} for c, q, s in analytics.spend_by_category(snapshot)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f)
+
+
+def _issued_by_department(conn, params, path, progress):
+    snapshot = analytics.load_snapshot(conn)
+    rows = [{'department': d, 'quantity': q} for d, q in analytics.issued_by_department(snapshot).items()]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f)
+
+
+def _laptop_lifecycle(conn, params, path, progress):
+    rows = analytics.laptop_lifecycle(analytics.load_snapshot(conn))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, default=str)
+
+
+# kind -> (runner, file extension, mimetype, allowed parameters)
+JOB_KINDS = {
+    'purchases_csv': (_export_purchases, 'csv', 'text/csv', ('start_date', 'end_date')),
+    'laptop_report': (_laptop_report, 'json', 'application/json', ('filter_by', 'filter_value', 'filter_date')),
+    'stock_summary': (_stock_summary, 'json', 'application/json', ()),
+    'spend_by_category': (_spend_by_category, 'json', 'application/json', ()),
+    'issued_by_department': (_issued_by_department, 'json', 'application/json', ()),
+    'laptop_lifecycle': (_laptop_lifecycle, 'json', 'application/json', ()),
+}
+
+
+def init_jobs_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            params_hash TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            result_path TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            finished_at TEXT,
+            expires_at TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_params_hash ON jobs (params_hash, status)')
+    conn.commit()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn rather than fork: the web worker may already be running threads
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _params_hash(kind, params, data_version):
+    return hashlib.sha256(json.dumps([kind, params, data_version], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _run_job(job_id, kind, params, result_dir):
+    """Entry point inside the worker process."""
+    runner, ext, _, _ = JOB_KINDS[kind]
+    path = os.path.join(result_dir, f'{job_id}.{ext}')
+    conn = get_db_connection()
+    try:
+        execute("UPDATE jobs SET status = 'running' WHERE id = ?", (job_id,))
+
+        def progress(fraction):
+            execute('UPDATE jobs SET progress = ? WHERE id = ?', (round(min(fraction, 1.0), 3), job_id))
+
+        runner(conn, params, path, progress)
+        finished = datetime.now()
+        execute(
+            "UPDATE jobs SET status = 'done', progress = 1, result_path = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+            (path, finished.strftime('%Y-%m-%d %H:%M:%S'), (finished + RESULT_TTL).strftime('%Y-%m-%d %H:%M:%S'), job_id)
+        )
+    except Exception as e:
+        logging.error(f"Job {job_id} ({kind}) failed: {e}")
+        execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?", (str(e), _now(), job_id))
+        if os.path.exists(path):
+            os.remove(path)
+    finally:
+        conn.close()
+
+
+def purge_expired_jobs(conn):
+    """Delete expired results, and fail jobs left queued or running by a dead worker.
+
+    Runs as a writer job; the result files are removed once the rows are gone.
+    """
+    stale_before = (datetime.now() - STALE_AFTER).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', error = 'Abandoned: the worker running it stopped', finished_at = ? "
+        "WHERE status IN ('queued', 'running') AND created_at <= ?",
+        (_now(), stale_before)
+    )
+    expired = conn.execute('SELECT id, result_path FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?', (_now(),)).fetchall()
+    conn.executemany('DELETE FROM jobs WHERE id = ?', [(job['id'],) for job in expired])
+
+    def remove_results():
+        for job in expired:
+            if job['result_path'] and os.path.exists(job['result_path']):
+                os.remove(job['result_path'])
+    conn.after_commit(remove_results)
+
+
+def _queue_job(conn, kind, params):
+    """(job id, whether it is new): the lookup and insert are one writer job, so
+    two requests for the same report cannot both queue it."""
+    init_jobs_table(conn)
+    purge_expired_jobs(conn)
+    params_hash = _params_hash(kind, params, changes.current_cursor(conn))
+    existing = conn.execute(
+        "SELECT id, status, result_path FROM jobs WHERE params_hash = ? AND status IN ('queued', 'running', 'done') ORDER BY created_at DESC LIMIT 1",
+        (params_hash,)
+    ).fetchone()
+    if existing and (existing['status'] != 'done' or os.path.exists(existing['result_path'] or '')):
+        return existing['id'], False
+
+    job_id = uuid.uuid4().hex
+    conn.execute(
+        'INSERT INTO jobs (id, kind, params, params_hash, created_at) VALUES (?, ?, ?, ?, ?)',
+        (job_id, kind, json.dumps(params, sort_keys=True), params_hash, _now())
+    )
+    return job_id, True
+
+
+def submit_job(kind, params, result_dir):
+    """Queue a job, or return the id of an identical job over the same data that is pending or still cached."""
+    params = {k: params.get(k, '') for k in JOB_KINDS[kind][3]}
+    job_id, new = write(_queue_job, kind, params)
+    if not new:
+        return job_id
+
+    os.makedirs(result_dir, exist_ok=True)
+    _get_executor().submit(_run_job, job_id, kind, params, result_dir)
+    return job_id
+
+
+def result_dir():
+    return os.path.join(current_app.instance_path, 'job_results')
+
+
+def get_job(job_id):
+    conn = get_db_connection()
+    try:
+        init_jobs_table(conn)
+        return conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def run_or_reuse(kind, params):
+    """Submit a job (or find its twin); returns the job row, whose status is 'done' once the result is ready."""
+    return get_job(submit_job(kind, params, result_dir()))
+
+
+def read_laptop_report(job):
+    with open(job['result_path'], encoding='utf-8') as f:
+        return analytics.LaptopReport.load(f)
+
+
+def _job_status(job):
+    status = {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+        'expires_at': job['expires_at'],
+        'error': job['error']
+    }
+    if job['status'] == 'done':
+        status['download_url'] = url_for('jobs.job_result', job_id=job['id'])
+    return status
+
+
+@jobs_bp.route('/<kind>', methods=['POST'])
+def create_job(kind):
+    if kind not in JOB_KINDS:
+        return jsonify({'success': False, 'message': 'Unknown job type'}), 404
+    params = request.get_json(silent=True) or request.values.to_dict()
+    job_id = submit_job(kind, params, result_dir())
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('jobs.job_status', job_id=job_id)}), 202
+
+
+@jobs_bp.route('/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(_job_status(job))
+
+
+@jobs_bp.route('/<job_id>/result')
+@request_class('heavy')
+def job_result(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job['status'] != 'done' or not job['result_path'] or not os.path.exists(job['result_path']):
+        return jsonify(_job_status(job)), 409
+    _, ext, mimetype, _ = JOB_KINDS[job['kind']]
+    return send_file(job['result_path'], mimetype=mimetype, as_attachment=True, download_name=f"{job['kind']}_{job['id'][:8]}.{ext}")
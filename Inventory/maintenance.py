@@ -0,0 +1,323 @@
+from flask import Blueprint, jsonify, session
+from datetime import datetime, timedelta
+import threading
+import argparse
+import logging
+import sqlite3
+import json
+import time
+import os
+
+import db
+from db import get_db_connection
+from changes import prune_changes
+from admission import request_class
+from writer import writer, write, execute
+
+# Database maintenance: hot backups, planner statistics, incremental vacuum
+# and health reporting. Usable from the command line
+# (python maintenance.py health|backup|analyze|vacuum|changelog|convert-auto-vacuum|run-due),
+# from the admin endpoints below, and from a background scheduler started in
+# each worker. The one-time switch to auto_vacuum=INCREMENTAL rewrites the whole
+# file under an exclusive lock, so it is never scheduled: an admin runs the
+# convert-auto-vacuum task when downtime is acceptable, and until then the
+# scheduled vacuum does nothing.
+
+maintenance_bp = Blueprint('maintenance', __name__, url_prefix='/admin/maintenance')
+
+BACKUP_DIR = 'backups'
+BACKUPS_TO_KEEP = 7
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_PAUSE_SECONDS = 0.01
+# a write from another connection restarts the copy; give up after this many
+BACKUP_MAX_RESTARTS = 5
+VACUUM_PAGES_PER_RUN = 1000
+SCHEDULER_POLL_SECONDS = 300
+
+# task -> how often it should run
+SCHEDULE = {
+    'analyze': timedelta(days=1),
+    'vacuum': timedelta(days=1),
+    'backup': timedelta(days=1),
+    'changelog': timedelta(days=1),
+}
+
+# tasks only ever run on request
+MANUAL_TASKS = ('convert-auto-vacuum',)
+
+
+def init_maintenance_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            details TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_maintenance_runs_task ON maintenance_runs (task, started_at)')
+    conn.commit()
+
+
+class BackupRestarted(Exception):
+    """Writes kept restarting the backup copy."""
+
+
+def backup(dest_dir=BACKUP_DIR, keep=BACKUPS_TO_KEEP, max_restarts=BACKUP_MAX_RESTARTS):
+    """Copy the live database with the SQLite backup API.
+
+    The copy is made a few hundred pages at a time with a short pause between
+    steps, so writers only ever wait for one step rather than the whole copy.
+    Every write from another connection restarts the copy, so under steady
+    writes it could run forever: after `max_restarts` restarts it gives up,
+    keeps the previous backups and reports the backup as incomplete.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    name = f"inventory-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+    path = os.path.join(dest_dir, name)
+    tmp = path + '.tmp'
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        # a restart shows up as more pages left than after the previous step
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupRestarted(f'restarted {restarts} times by concurrent writes')
+        last_remaining = remaining
+        time.sleep(BACKUP_PAUSE_SECONDS)
+
+    src = get_db_connection()
+    dst = sqlite3.connect(tmp)
+    started = time.perf_counter()
+    error = None
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=progress)
+    except BackupRestarted as e:
+        error = str(e)
+    finally:
+        dst.close()
+        src.close()
+    if error:
+        os.remove(tmp)
+        logging.warning(f'Backup abandoned, previous backups kept: {error}')
+        return {'complete': False, 'error': error, 'restarts': restarts, 'seconds': round(time.perf_counter() - started, 3)}
+    os.replace(tmp, path)
+
+    backups = sorted(f for f in os.listdir(dest_dir) if f.startswith('inventory-') and f.endswith('.db'))
+    for old in backups[:-keep] if keep else []:
+        os.remove(os.path.join(dest_dir, old))
+    return {'complete': True, 'path': path, 'bytes': os.path.getsize(path), 'restarts': restarts,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def analyze(conn):
+    """Refresh planner statistics."""
+    started = time.perf_counter()
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    conn.commit()
+    return {'seconds': round(time.perf_counter() - started, 3)}
+
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES_PER_RUN):
+    """Return up to `pages` free pages to the filesystem.
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL; on a database that has
+    not been converted (see convert_auto_vacuum) this does nothing.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        logging.warning('Skipping incremental vacuum: auto_vacuum is not INCREMENTAL; run the convert-auto-vacuum task')
+        return {'skipped': 'auto_vacuum is not incremental', 'freed_pages': 0}
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+    conn.commit()
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {'freed_pages': before - after}
+
+
+def convert_auto_vacuum(conn):
+    """Switch the database to auto_vacuum=INCREMENTAL with one full VACUUM.
+
+    The VACUUM rewrites the whole file and blocks every writer until it is
+    done, so this only runs when an admin asks for it.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return {'converted': False, 'freed_pages': 0}
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    started = time.perf_counter()
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return {'converted': True, 'freed_pages': before, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def health(conn):
+    """Page counts, fragmentation, WAL size and per-table row counts."""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    wal_path = db.DATABASE + '-wal'
+    tables = [r['name'] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    init_maintenance_table(conn)
+    last_runs = {r['task']: r['finished_at'] for r in conn.execute(
+        'SELECT task, MAX(finished_at) as finished_at FROM maintenance_runs WHERE finished_at IS NOT NULL GROUP BY task')}
+    return {
+        'database': os.path.abspath(db.DATABASE),
+        'file_bytes': os.path.getsize(db.DATABASE) if os.path.exists(db.DATABASE) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'fragmentation': round(freelist / page_count, 4) if page_count else 0.0,
+        'journal_mode': conn.execute('PRAGMA journal_mode').fetchone()[0],
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(conn.execute('PRAGMA auto_vacuum').fetchone()[0]),
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'analyzed': conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0] == 1,
+        'tables': {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in tables},
+        'last_runs': last_runs,
+    }
+
+
+def run_task(task):
+    """Run one maintenance task now and record it in maintenance_runs."""
+    conn = get_db_connection()
+    try:
+        init_maintenance_table(conn)
+        run_id = execute('INSERT INTO maintenance_runs (task, started_at) VALUES (?, ?)',
+                         (task, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        return _finish(conn, run_id, task)
+    finally:
+        conn.close()
+
+
+def _finish(conn, run_id, task):
+    if task == 'backup':
+        details = backup()
+    elif task == 'analyze':
+        details = analyze(conn)
+    elif task == 'vacuum':
+        details = incremental_vacuum(conn)
+    elif task == 'convert-auto-vacuum':
+        details = convert_auto_vacuum(conn)
+    elif task == 'changelog':
+        details = write(prune_changes)
+    else:
+        raise ValueError(f'Unknown maintenance task: {task}')
+    execute('UPDATE maintenance_runs SET finished_at = ?, details = ? WHERE id = ?',
+            (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), json.dumps(details), run_id))
+    logging.info(f'Maintenance task {task} finished: {details}')
+    return details
+
+
+def _claim(conn, task, interval):
+    """Record a run of `task` if it is due; returns the run id, or None if not due.
+
+    Runs as a writer job: the check and insert share the writer's BEGIN
+    IMMEDIATE transaction, so when several workers poll at once only one of
+    them claims the run.
+    """
+    now = datetime.now()
+    last = conn.execute('SELECT MAX(started_at) FROM maintenance_runs WHERE task = ?', (task,)).fetchone()[0]
+    if last and datetime.strptime(last, '%Y-%m-%d %H:%M:%S') + interval > now:
+        return None
+    return conn.execute('INSERT INTO maintenance_runs (task, started_at) VALUES (?, ?)',
+                        (task, now.strftime('%Y-%m-%d %H:%M:%S'))).lastrowid
+
+
+def run_due_tasks():
+    """Run every scheduled task whose interval has elapsed."""
+    conn = get_db_connection()
+    init_maintenance_table(conn)
+    results = {}
+    try:
+        for task, interval in SCHEDULE.items():
+            run_id = write(_claim, task, interval)
+            if run_id is None:
+                continue
+            try:
+                results[task] = _finish(conn, run_id, task)
+            except Exception as e:
+                conn.rollback()
+                logging.error(f'Maintenance task {task} failed: {e}')
+    finally:
+        conn.close()
+    return results
+
+
+_scheduler_started = False
+
+
+def start_scheduler(poll_seconds=SCHEDULER_POLL_SECONDS):
+    """Start the background maintenance thread for this process (once)."""
+    global _scheduler_started
+    if _scheduler_started or os.environ.get('INVENTORY_MAINTENANCE', '1') == '0':
+        return
+    _scheduler_started = True
+
+    def loop():
+        while True:
+            try:
+                run_due_tasks()
+            except Exception as e:
+                logging.error(f'Maintenance scheduler error: {e}')
+            time.sleep(poll_seconds)
+
+    threading.Thread(target=loop, name='maintenance-scheduler', daemon=True).start()
+
+
+def _admin_only():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied: Admins only.'}), 403
+    return None
+
+
+@maintenance_bp.route('')
+def status():
+    denied = _admin_only()
+    if denied:
+        return denied
+    conn = get_db_connection()
+    report = health(conn)
+    conn.close()
+    report['writer'] = writer.stats()
+    return jsonify(report)
+
+
+@maintenance_bp.route('/<task>', methods=['POST'])
+@request_class('heavy')
+def run(task):
+    denied = _admin_only()
+    if denied:
+        return denied
+    if task not in SCHEDULE and task not in MANUAL_TASKS:
+        return jsonify({'success': False, 'message': 'Unknown maintenance task'}), 404
+    try:
+        details = run_task(task)
+    except sqlite3.Error as e:
+        logging.error(f'Maintenance task {task} failed: {e}')
+        return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify({'success': True, 'task': task, 'details': details})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inventory database maintenance')
+    parser.add_argument('command', choices=['health', 'run-due'] + list(SCHEDULE) + list(MANUAL_TASKS))
+    parser.add_argument('--database', default=db.DATABASE, help='path to the SQLite database')
+    args = parser.parse_args(argv)
+    db.DATABASE = args.database
+
+    if args.command == 'health':
+        conn = get_db_connection()
+        result = health(conn)
+        conn.close()
+    elif args.command == 'run-due':
+        result = run_due_tasks()
+    else:
+        result = run_task(args.command)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import csv
+from datetime import datetime, timedelta
+
+from staffing import ISSUE_STAFF_ID_SQL
+
+# Shared report builders. These take an open connection and plain arguments so
+# they can run both inside a request and inside a background job process.
+
+PURCHASE_EXPORT_HEADER = ['Purchase ID', 'Vendor', 'Date', 'Category', 'Subcategory', 'Specifications', 'Serial Number', 'Quantity', 'Unit Price', 'Total Price']
+
+LAPTOP_FILTER_COLUMNS = {
+    'Users': 'iss.staff_name',
+    'Department': 'iss.department',
+    'Specs': 'iss.specs',
+    'Serial No': 'iss.serial_no'
+}
+
+LAPTOP_DATE_COLUMNS = {
+    'Date of Purchase': 'p.date',
+    'Issue Date': 'iss.date',
+    'Employee Joining Date': 'st.date_of_joining'
+}
+
+
+def write_purchases_csv(conn, path, start_date='', end_date='', progress=None):
+    """Stream the purchases export to `path` without holding every row in memory."""
+    query = 'SELECT p.id, p.vendor, p.date, c.name as category, s.name as subcategory, i.specs, p.serial_no, p.quantity, p.unit_price, (p.quantity * p.unit_price) as total_price FROM purchases p LEFT JOIN items i ON p.item_id = i.id LEFT JOIN categories c ON i.category_id = c.id LEFT JOIN subcategories s ON i.subcategory_id = s.id'
+    params = []
+    if start_date and end_date:
+        query += ' WHERE date(substr(p.date, 7, 4) || \'-\' || substr(p.date, 4, 2) || \'-\' || substr(p.date, 1, 2)) BETWEEN date(?) AND date(?)'
+        params = [start_date, end_date]
+    query += ' ORDER BY p.date DESC'
+
+    total_rows = 0
+    if progress:
+        total_rows = conn.execute('SELECT COUNT(*) FROM (' + query + ')', params).fetchone()[0]
+
+    total_items = 0
+    total_amount = 0.0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(PURCHASE_EXPORT_HEADER)
+        for n, p in enumerate(conn.execute(query, params), 1):
+            writer.writerow([p['id'], p['vendor'], p['date'], p['category'], p['subcategory'], p['specs'] or '', p['serial_no'] or '', p['quantity'], f"{p['unit_price']:.2f}", f"{p['total_price']:.2f}"])
+            total_items += p['quantity']
+            total_amount += p['total_price']
+            if progress and n % 1000 == 0:
+                progress(n / total_rows)
+        writer.writerow([])
+        writer.writerow(['Total Items Purchased', total_items])
+        writer.writerow(['Total Amount Purchased', f"{total_amount:.2f}"])
+    return path
+
+
+def parse_report_date(s):
+    if not s:
+        return None
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def laptop_report_rows(conn, filter_by='All', filter_value='', filter_date=''):
+    """Rows for the laptop report, with end-of-life and eligibility dates filled in."""
+    params = []
+    query = f'''
+        SELECT DISTINCT
+            iss.staff_name AS Users,
+            iss.department AS Department,
+            iss.date AS "Issue Date",
+            iss.specs AS Specs,
+            p.date AS "Date of Purchase",
+            iss.serial_no AS "Serial No",
+            st.date_of_joining AS "Employee Joining Date",
+            p.remarks AS "Description/Remarks"
+        FROM issues iss
+        LEFT JOIN items i ON iss.item_id = i.id
+        LEFT JOIN purchases p ON i.id = p.item_id
+        LEFT JOIN staff st ON st.id = {ISSUE_STAFF_ID_SQL}
+        LEFT JOIN categories c ON i.category_id = c.id
+        LEFT JOIN subcategories s ON i.subcategory_id = s.id
+        WHERE LOWER(c.name) LIKE "%pc%"
+          AND LOWER(s.name) = "laptop"
+          AND (iss.is_return IS NULL OR iss.is_return = 0)
+    '''
+
+    if filter_by != 'All':
+        if filter_by in LAPTOP_FILTER_COLUMNS and filter_value:
+            query += f" AND {LAPTOP_FILTER_COLUMNS[filter_by]} LIKE ?"
+            params.append(f'%{filter_value}%')
+        elif filter_by in LAPTOP_DATE_COLUMNS and filter_date:
+            query += f" AND DATE({LAPTOP_DATE_COLUMNS[filter_by]}) = DATE(?)"
+            params.append(filter_date)
+
+    query += " GROUP BY iss.id ORDER BY iss.id DESC"
+
+    laptop_data = []
+    for row in conn.execute(query, params):
+        purchase_str = row["Date of Purchase"]
+        join_str = row["Employee Joining Date"]
+
+        purchase_dt = parse_report_date(purchase_str)
+        join_dt = parse_report_date(join_str)
+
+        end_of_life_str = (purchase_dt + timedelta(days=1642)).strftime("%d %B, %Y") if purchase_dt else None
+        eligibility_str = (join_dt + timedelta(days=547)).strftime("%d %B, %Y") if join_dt else None
+
+        laptop_data.append({
+            "Users": row["Users"],
+            "Department": row["Department"],
+            "Laptop Age Policy": "4.5 Years",
+            "Date of Purchase": purchase_str,
+            "End of Laptop Life": end_of_life_str,
+            "Issue Date": row["Issue Date"],
+            "Employee Joining Date": join_str,
+            "Employee Eligibility": eligibility_str,
+            "Specs": row["Specs"],
+            "Serial No": row["Serial No"],
+            "Description": row["Description/Remarks"]
+        })
+    return laptop_data
@@ -0,0 +1,100 @@
+from flask import Response, request
+import gzip
+import json
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; JSON is always available
+    msgpack = None
+
+# Shared response helper for the JSON lookup and listing endpoints.
+#
+# The body format is negotiated from the Accept header (or ?format=):
+#   application/json                      the usual list of objects (default)
+#   application/vnd.inventory.columnar+json  {"columns": [...], "rows": [[...]]}
+#   application/msgpack                   the columnar shape, msgpack-encoded
+# The columnar shape sends each key once instead of once per row. The body
+# is then gzip- or brotli-compressed when the client accepts it and the body
+# is big enough for compression to pay off.
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.inventory.columnar+json'
+MSGPACK = 'application/msgpack'
+
+FORMATS = {'json': JSON, 'columnar': COLUMNAR_JSON, 'msgpack': MSGPACK}
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings():
+    """Content codings the client accepts, best first, from those we can produce."""
+    accepted = set()
+    for value in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = value.partition(';')
+        params = params.strip()
+        try:
+            q = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return [coding for coding in available if coding in accepted]
+
+
+def available_formats():
+    return [JSON, COLUMNAR_JSON] + ([MSGPACK] if msgpack is not None else [])
+
+
+def negotiate_format():
+    requested = FORMATS.get(request.args.get('format', ''))
+    if requested in available_formats():
+        return requested
+    return request.accept_mimetypes.best_match(available_formats(), default=JSON)
+
+
+def to_columnar(rows):
+    """[{...}, ...] -> {"columns": [...], "rows": [[...], ...]}."""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {'columns': columns, 'rows': [[row.get(key) for key in columns] for row in rows]}
+
+
+def encode(data, mimetype):
+    if mimetype != JSON and isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        data = to_columnar(data)
+    if mimetype == MSGPACK:
+        return msgpack.packb(data, use_bin_type=True, default=str)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def compress(body, coding):
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_response(body, mimetype, status=200):
+    """Response for an already-serialized body, compressed if the client accepts it."""
+    response = Response(status=status, mimetype=mimetype)
+    encodings = accepted_encodings() if len(body) >= MIN_COMPRESS_BYTES else []
+    if encodings:
+        body = compress(body, encodings[0])
+        response.headers['Content-Encoding'] = encodings[0]
+    response.set_data(body)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compact_response(data, status=200):
+    """Serialize `data` in the negotiated format and content coding."""
+    mimetype = negotiate_format()
+    response = encoded_response(encode(data, mimetype), mimetype, status)
+    response.vary.add('Accept')
+    return response
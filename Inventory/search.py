@@ -0,0 +1,232 @@
+from collections import Counter
+import threading
+import heapq
+
+from db import get_db_connection
+import changes
+
+# In-memory trigram indexes behind /api/autocomplete. The app builds them at
+# startup (before gunicorn forks, so workers share them copy-on-write) and
+# each worker keeps them current by replaying the changelog
+# (see changes.py): every search first compares the changelog cursor (one
+# primary-key lookup) and applies whatever was written since, so a write
+# made by any worker is searchable from the next request on, without a full
+# rebuild. Matching is by trigram overlap, which tolerates typos and partial
+# words, with a bonus for prefix and substring hits. An empty query with a
+# filter lists the filtered docs by name, which is how the issue form fills
+# its pickers before anything is typed.
+
+INDEX_TYPES = ['staff', 'specs', 'serial']
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Candidates come from the query's rarest trigrams only; postings longer
+# than COMMON_GRAM_POSTINGS are skipped once rarer trigrams have produced
+# some. All trigrams still count when the best RESCORE_CANDIDATES candidates
+# (after any filter) are rescored.
+CANDIDATE_GRAMS = 6
+COMMON_GRAM_POSTINGS = 1000
+RESCORE_CANDIDATES = 64
+
+STAFF_SQL = 'SELECT id, name, dept, designation FROM staff WHERE {where}'
+
+SPECS_SQL = '''
+    SELECT i.id, i.specs, i.category_id, i.subcategory_id, c.name as category, s.name as subcategory
+    FROM items i
+    LEFT JOIN categories c ON i.category_id = c.id
+    LEFT JOIN subcategories s ON i.subcategory_id = s.id
+    WHERE i.specs_key <> '' AND {where}
+'''
+
+SERIAL_SQL = '''
+    SELECT p.id, p.serial_no, p.item_id, i.subcategory_id
+    FROM purchases p
+    JOIN items i ON p.item_id = i.id
+    WHERE p.serial_no IS NOT NULL AND TRIM(p.serial_no) <> '' AND {where}
+'''
+
+# which changelog table feeds which index, and the query for one of its docs
+SOURCES = {
+    'staff': ('staff', STAFF_SQL, 'id'),
+    'specs': ('items', SPECS_SQL, 'i.id'),
+    'serial': ('purchases', SERIAL_SQL, 'p.id'),
+}
+
+# specs docs show their category and subcategory names, so a change to one of
+# these tables re-indexes the items under it
+SPECS_PARENTS = {'categories': 'i.category_id', 'subcategories': 'i.subcategory_id'}
+
+
+def trigrams(text):
+    padded = f'  {" ".join(text.casefold().split())} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+
+    def add(self, doc_id, text, payload):
+        self.remove(doc_id)
+        grams = trigrams(text)
+        self.docs[doc_id] = (text.casefold(), grams, payload)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for gram in doc[1]:
+            posting = self.postings.get(gram)
+            posting.discard(doc_id)
+            if not posting:
+                del self.postings[gram]
+
+    def search(self, query, limit=DEFAULT_LIMIT, where=None):
+        """Top `limit` payloads for `query`, best first. `where` filters payloads."""
+        query = ' '.join(query.casefold().split())
+        if not query:
+            if where is None:
+                return []
+            matches = ((text, doc_id, payload) for doc_id, (text, _, payload) in self.docs.items() if where(payload))
+            return [payload for _, _, payload in heapq.nsmallest(limit, matches, key=lambda m: (m[0], m[1]))]
+        query_grams = trigrams(query)
+
+        # Rarest trigrams first: they are the most selective and the cheapest.
+        counts = Counter()
+        postings = sorted((p for p in map(self.postings.get, query_grams) if p), key=len)
+        for posting in postings[:CANDIDATE_GRAMS]:
+            if counts and len(posting) > COMMON_GRAM_POSTINGS:
+                break
+            counts.update(posting)
+
+        candidates = counts if where is None else (d for d in counts if where(self.docs[d][2]))
+        scored = []
+        for doc_id in heapq.nlargest(RESCORE_CANDIDATES, candidates, key=counts.__getitem__):
+            text, grams, payload = self.docs[doc_id]
+            shared = len(query_grams & grams)
+            score = shared / (len(query_grams) + len(grams) - shared)
+            if text.startswith(query):
+                score += 0.5
+            elif query in text:
+                score += 0.25
+            scored.append((score, doc_id, payload))
+        return [payload for _, _, payload in heapq.nlargest(limit, scored, key=lambda s: (s[0], -s[1]))]
+
+
+def _doc(kind, row):
+    if kind == 'staff':
+        return row['name'], {'id': row['id'], 'name': row['name'], 'department': row['dept'], 'designation': row['designation']}
+    if kind == 'specs':
+        return row['specs'], {'id': row['id'], 'specs': row['specs'], 'category': row['category'],
+                              'subcategory': row['subcategory'], 'subcategory_id': row['subcategory_id']}
+    return row['serial_no'], {'serial_no': row['serial_no'].strip(), 'item_id': row['item_id'],
+                              'subcategory_id': row['subcategory_id']}
+
+
+def _items_under(conn, records):
+    """Ids of the specs items under the categories and subcategories in `records`."""
+    item_ids = []
+    for table, column in SPECS_PARENTS.items():
+        parent_ids = [r['id'] for r in records if r['table'] == table]
+        if parent_ids:
+            placeholders = ', '.join('?' * len(parent_ids))
+            item_ids += [row['id'] for row in conn.execute(SPECS_SQL.format(where=f'{column} IN ({placeholders})'), parent_ids)]
+    return item_ids
+
+
+class SearchIndexes:
+    """The per-worker set of indexes plus the changelog cursor they reflect."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = None
+        self.cursor = 0
+
+    def _rebuild(self, conn):
+        cursor = changes.current_cursor(conn)
+        indexes = {kind: TrigramIndex() for kind in INDEX_TYPES}
+        for kind, (_, sql, _) in SOURCES.items():
+            for row in conn.execute(sql.format(where='1')):
+                indexes[kind].add(row['id'], *_doc(kind, row))
+        self.indexes, self.cursor = indexes, cursor
+
+    def _apply_changes(self, conn):
+        try:
+            while True:
+                records, cursor, more = changes.get_changes(conn, self.cursor, changes.MAX_LIMIT)
+                self._apply(conn, records)
+                self.cursor = cursor
+                if not more:
+                    break
+        except changes.CursorExpired:
+            self._rebuild(conn)
+
+    def _apply(self, conn, records):
+        for kind, (table, sql, id_column) in SOURCES.items():
+            row_ids = [r['id'] for r in records if r['table'] == table]
+            if kind == 'specs':
+                row_ids = list(dict.fromkeys(row_ids + _items_under(conn, records)))
+            if not row_ids:
+                continue
+            placeholders = ', '.join('?' * len(row_ids))
+            query = sql.format(where=f'{id_column} IN ({placeholders})')
+            current = {row['id']: row for row in conn.execute(query, row_ids)}
+            for row_id in row_ids:
+                if row_id in current:
+                    self.indexes[kind].add(row_id, *_doc(kind, current[row_id]))
+                else:
+                    # deleted, or no longer has specs/serial to index
+                    self.indexes[kind].remove(row_id)
+
+    def refresh(self):
+        """Build on first use, then catch up with anything written since the last search."""
+        conn = get_db_connection()
+        try:
+            if self.indexes is not None and changes.current_cursor(conn) == self.cursor:
+                return
+            with self.lock:
+                if self.indexes is None:
+                    self._rebuild(conn)
+                else:
+                    self._apply_changes(conn)
+        finally:
+            conn.close()
+
+    def search(self, kind, query, limit=DEFAULT_LIMIT, where=None):
+        self.refresh()
+        with self.lock:
+            return self.indexes[kind].search(query, limit, where)
+
+
+indexes = SearchIndexes()
+
+
+def autocomplete(kind, query, limit=DEFAULT_LIMIT, department=None, subcategory_id=None, item_id=None):
+    """Top matches of `kind` ('staff', 'specs' or 'serial') for `query`."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f'Unknown autocomplete type: {kind}')
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    where = None
+    if kind == 'staff' and department:
+        department = department.casefold()
+        where = lambda p: (p['department'] or '').casefold() == department
+    elif kind == 'serial' and item_id:
+        item_id = int(item_id)
+        where = lambda p: p['item_id'] == item_id
+    elif kind in ('specs', 'serial') and subcategory_id:
+        subcategory_id = int(subcategory_id)
+        where = lambda p: p['subcategory_id'] == subcategory_id
+
+    if kind != 'serial':
+        return indexes.search(kind, query, limit, where)
+    # The same serial can appear on several purchase rows; return it once.
+    seen, results = set(), []
+    for payload in indexes.search(kind, query, limit * 3, where):
+        key = (payload['serial_no'], payload['item_id'])
+        if key not in seen:
+            seen.add(key)
+            results.append(payload)
+    return results[:limit]
@@ -0,0 +1,397 @@
+import sqlite3
+
+from alerts import evaluate_items
+from catalog import resolve_item
+from sites import get_site, record_moves, site_balances
+from staffing import get_staff, staff_match_params, STAFF_MATCH_SQL
+
+# One implementation per inventory lookup/mutation, shared by the main and API
+# blueprints. SQL lives in module constants so every call reuses the same text
+# and hits sqlite3's per-connection prepared statement cache.
+
+SUBCATEGORIES_SQL = 'SELECT id, name FROM subcategories WHERE category_id = ? ORDER BY name'
+
+CATEGORIES_SQL = 'SELECT id, name FROM categories ORDER BY name'
+
+# EXISTS stops at the first purchase instead of joining every purchase row and
+# de-duplicating the fan-out with DISTINCT.
+PURCHASE_SPECS_SQL = '''
+    SELECT i.id as id, TRIM(i.specs) as specs
+    FROM items i
+    WHERE i.subcategory_id = ?
+      AND i.specs_key <> ''
+      AND EXISTS (SELECT 1 FROM purchases p WHERE p.item_id = i.id)
+    ORDER BY i.specs
+'''
+
+FIND_CATEGORY_SQL = 'SELECT id FROM categories WHERE LOWER(name) = LOWER(?)'
+
+FIND_SUBCATEGORY_SQL = 'SELECT id FROM subcategories WHERE LOWER(name) = LOWER(?) AND category_id = ?'
+
+# Purchases and issues are summed per item first, so each is scanned once
+# through its item_id index before being rolled up by category/subcategory.
+STOCK_SUMMARY_SQL = '''
+    WITH purchased AS (SELECT item_id, SUM(quantity) as qty FROM purchases GROUP BY item_id),
+    issued AS (SELECT item_id, SUM(CASE WHEN is_return = 0 THEN quantity ELSE 0 END) as qty FROM issues GROUP BY item_id)
+    SELECT c.name as category, s.name as subcategory,
+           COALESCE(SUM(pu.qty), 0) as total_purchased,
+           COALESCE(SUM(iu.qty), 0) as total_issued,
+           COALESCE(SUM(pu.qty), 0) - COALESCE(SUM(iu.qty), 0) as stock_available
+    FROM items i
+    JOIN categories c ON i.category_id = c.id
+    JOIN subcategories s ON i.subcategory_id = s.id
+    LEFT JOIN purchased pu ON pu.item_id = i.id
+    LEFT JOIN issued iu ON iu.item_id = i.id
+    GROUP BY c.name, s.name
+    ORDER BY c.name, s.name
+'''
+
+# Same shape as STOCK_SUMMARY_SQL, restricted to the category/subcategory groups
+# that contain the given items so only their purchases and issues are read.
+STOCK_CHANGES_SQL = '''
+    WITH affected AS (
+        SELECT i.id FROM items i
+        JOIN categories c ON i.category_id = c.id
+        JOIN subcategories s ON i.subcategory_id = s.id
+        WHERE (c.name, s.name) IN (
+            SELECT c2.name, s2.name FROM items i2
+            JOIN categories c2 ON i2.category_id = c2.id
+            JOIN subcategories s2 ON i2.subcategory_id = s2.id
+            WHERE i2.id IN ({placeholders})
+        )
+    ),
+    purchased AS (SELECT item_id, SUM(quantity) as qty FROM purchases WHERE item_id IN (SELECT id FROM affected) GROUP BY item_id),
+    issued AS (SELECT item_id, SUM(CASE WHEN is_return = 0 THEN quantity ELSE 0 END) as qty FROM issues WHERE item_id IN (SELECT id FROM affected) GROUP BY item_id)
+    SELECT c.name as category, s.name as subcategory,
+           COALESCE(SUM(pu.qty), 0) as total_purchased,
+           COALESCE(SUM(iu.qty), 0) as total_issued,
+           COALESCE(SUM(pu.qty), 0) - COALESCE(SUM(iu.qty), 0) as stock_available
+    FROM items i
+    JOIN categories c ON i.category_id = c.id
+    JOIN subcategories s ON i.subcategory_id = s.id
+    LEFT JOIN purchased pu ON pu.item_id = i.id
+    LEFT JOIN issued iu ON iu.item_id = i.id
+    WHERE i.id IN (SELECT id FROM affected)
+    GROUP BY c.name, s.name
+    ORDER BY c.name, s.name
+'''
+
+PURCHASE_ROWS_SQL = '''
+    SELECT
+        p.id, p.vendor, p.date, c.name as category, s.name as subcategory,
+        i.specs, p.remarks, p.serial_no, p.quantity, p.unit_price,
+        (p.quantity * p.unit_price) as total_price, p.bill_image
+    FROM purchases p
+    JOIN items i ON p.item_id = i.id
+    JOIN categories c ON i.category_id = c.id
+    JOIN subcategories s ON i.subcategory_id = s.id
+'''
+
+ISSUE_ROWS_SQL = '''
+    SELECT iss.id, iss.department, iss.staff_name, iss.item_name, iss.specs,
+           iss.quantity, iss.date, iss.remarks, iss.is_return,
+           iss.return_reason, iss.return_date, iss.serial_no,
+           c.name as category_name, s.name as subcategory_name
+    FROM issues iss
+    LEFT JOIN items i ON iss.item_id = i.id
+    LEFT JOIN categories c ON i.category_id = c.id
+    LEFT JOIN subcategories s ON i.subcategory_id = s.id
+'''
+
+STOCK_TOTALS_SQL = '''
+    SELECT (SELECT COALESCE(SUM(quantity), 0) FROM purchases) as total_purchase_quantity,
+           (SELECT COALESCE(SUM(CASE WHEN is_return = 0 THEN quantity ELSE 0 END), 0) FROM issues) as total_issue_quantity,
+           (SELECT COUNT(*) FROM staff) as total_staff_count
+'''
+
+
+# (category_id, subcategory_id) pairs whose purchased items carry specs; lines
+# in those subcategories must name the exact item.
+SPECS_REQUIRED_SQL = '''
+    SELECT DISTINCT i.category_id, i.subcategory_id
+    FROM items i
+    WHERE i.subcategory_id IN ({placeholders})
+      AND i.specs_key <> ''
+      AND EXISTS (SELECT 1 FROM purchases p WHERE p.item_id = i.id)
+'''
+
+ISSUE_ITEMS_SQL = '''
+    SELECT i.id, i.category_id, i.subcategory_id, i.specs, c.name as category_name, s.name as subcategory_name
+    FROM items i
+    LEFT JOIN categories c ON i.category_id = c.id
+    LEFT JOIN subcategories s ON i.subcategory_id = s.id
+    WHERE i.id IN ({placeholders})
+'''
+
+# Stock available per (item_id, serial_no) for every line of a batch in one
+# statement; serial_no '' means the item as a whole.
+ISSUE_AVAILABILITY_SQL = '''
+    WITH wanted (item_id, serial_no) AS (VALUES {values})
+    SELECT w.item_id, w.serial_no,
+           (SELECT COALESCE(SUM(p.quantity), 0) FROM purchases p
+             WHERE p.item_id = w.item_id AND (w.serial_no = '' OR p.serial_no = w.serial_no))
+         - (SELECT COALESCE(SUM(CASE WHEN iss.is_return = 0 THEN iss.quantity ELSE 0 END), 0) FROM issues iss
+             WHERE iss.item_id = w.item_id AND (w.serial_no = '' OR iss.serial_no = w.serial_no)) as available
+    FROM wanted w
+'''
+
+OPEN_ISSUES_SQL = '''
+    SELECT id, item_id, quantity, site_id FROM issues
+    WHERE ''' + STAFF_MATCH_SQL.format(p='') + ''' AND is_return = 0 AND item_id IN ({placeholders})
+    ORDER BY id DESC
+'''
+
+INSERT_ISSUE_SQL = '''
+    INSERT INTO issues (dept_id, item_id, quantity, date, specs, remarks, staff_id, department, staff_name,
+                        item_name, category, subcategory, is_return, serial_no, site_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+'''
+
+RETURN_ISSUE_SQL = 'UPDATE issues SET is_return = 1, return_reason = ?, return_date = ? WHERE id = ?'
+
+INSERT_PURCHASE_SQL = '''
+    INSERT INTO purchases (item_id, vendor, date, serial_no, quantity, unit_price, remarks, bill_image, site_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def get_subcategories(conn, category_id):
+    return [{'id': r['id'], 'name': r['name']} for r in conn.execute(SUBCATEGORIES_SQL, (category_id,))]
+
+
+def get_categories(conn):
+    return [{'id': r['id'], 'name': r['name']} for r in conn.execute(CATEGORIES_SQL)]
+
+
+def get_purchase_specs(conn, subcategory_id):
+    """Items (id, specs) in a subcategory that have been purchased and have meaningful specs."""
+    return [{'id': r['id'], 'specs': r['specs']} for r in conn.execute(PURCHASE_SPECS_SQL, (subcategory_id,))]
+
+
+def add_category(conn, name):
+    """Create a category. Returns (payload, http status)."""
+    name = (name or '').strip()
+    if not name:
+        return {'success': False, 'message': 'Category name cannot be empty.'}, 400
+    if conn.execute(FIND_CATEGORY_SQL, (name,)).fetchone():
+        return {'success': False, 'message': 'Category already exists.'}, 409
+    try:
+        cursor = conn.execute('INSERT INTO categories (name) VALUES (?)', (name,))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {'success': False, 'message': str(e)}, 500
+    return {'success': True, 'category_id': cursor.lastrowid, 'message': 'Category added successfully'}, 200
+
+
+def add_subcategory(conn, name, category_id):
+    """Create a subcategory under `category_id`. Returns (payload, http status)."""
+    name = (name or '').strip()
+    if not name or not category_id:
+        return {'success': False, 'message': 'Subcategory name and category ID are required.'}, 400
+    if conn.execute(FIND_SUBCATEGORY_SQL, (name, category_id)).fetchone():
+        return {'success': False, 'message': 'Subcategory already exists for this category.'}, 409
+    try:
+        cursor = conn.execute('INSERT INTO subcategories (name, category_id) VALUES (?, ?)', (name, category_id))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {'success': False, 'message': str(e)}, 500
+    return {'success': True, 'subcategory_id': cursor.lastrowid, 'message': 'Subcategory added successfully'}, 200
+
+
+def add_item(conn, category_id, subcategory_id, specs, custom_category='', custom_subcategory=''):
+    """Create an item, and its category/subcategory when they are typed in. Returns (payload, http status)."""
+    if category_id == 'custom' and custom_category:
+        existing = conn.execute(FIND_CATEGORY_SQL, (custom_category,)).fetchone()
+        category_id = existing['id'] if existing else conn.execute(
+            'INSERT INTO categories (name) VALUES (?)', (custom_category,)).lastrowid
+    if subcategory_id == 'custom' and custom_subcategory:
+        existing = conn.execute(FIND_SUBCATEGORY_SQL, (custom_subcategory, category_id)).fetchone()
+        subcategory_id = existing['id'] if existing else conn.execute(
+            'INSERT INTO subcategories (name, category_id) VALUES (?, ?)', (custom_subcategory, category_id)).lastrowid
+    if not category_id or not subcategory_id or 'custom' in (category_id, subcategory_id):
+        return {'success': False, 'message': 'Category and Subcategory are required!'}, 400
+    if resolve_item(conn, category_id, subcategory_id, specs, create=False):
+        return {'success': False, 'message': 'An item with these specs already exists.'}, 409
+    item_id = resolve_item(conn, category_id, subcategory_id, specs)
+    conn.commit()
+    return {'success': True, 'item_id': item_id, 'message': 'Item added successfully!'}, 200
+
+
+def record_purchase(conn, vendor, date, bill_image, site_id, lines):
+    """Insert one bill's purchase lines and re-check alerts for the items bought.
+
+    Each line is a dict with category_id, subcategory_id, specs, serial_no,
+    quantity, unit_price and remarks; lines without a category, subcategory
+    or positive quantity are skipped. The site ledger moves are written in the
+    same transaction. Returns the purchase ids, item ids and whether the
+    alert set changed.
+    """
+    purchase_ids = []
+    item_ids = set()
+    moves = []
+    for line in lines:
+        if not line['category_id'] or not line['subcategory_id']:
+            continue
+        item_id = resolve_item(conn, line['category_id'], line['subcategory_id'], line['specs'])
+        if item_id and line['quantity'] > 0:
+            purchase_id = conn.execute(INSERT_PURCHASE_SQL, (item_id, vendor, date, line['serial_no'], line['quantity'],
+                                                             line['unit_price'], line['remarks'], bill_image, site_id)).lastrowid
+            purchase_ids.append(purchase_id)
+            item_ids.add(item_id)
+            moves.append((item_id, line['quantity'], 'purchase', purchase_id, date))
+    record_moves(conn, site_id, moves)
+    alerts_changed = evaluate_items(conn, item_ids)
+    conn.commit()
+    return {'purchase_ids': purchase_ids, 'item_ids': item_ids, 'alerts_changed': alerts_changed}
+
+
+def stock_summary(conn):
+    """Totals and per-subcategory balances shown on the stock page."""
+    summary = dict(conn.execute(STOCK_TOTALS_SQL).fetchone())
+    summary['stock_data'] = [dict(row) for row in conn.execute(STOCK_SUMMARY_SQL)]
+    return summary
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def stock_changes(conn, item_ids):
+    """Totals plus the stock rows of the subcategories containing `item_ids`.
+
+    Used to build live-update patches after a write without recomputing the
+    whole stock table.
+    """
+    item_ids = list(item_ids)
+    changes = dict(conn.execute(STOCK_TOTALS_SQL).fetchone())
+    if not item_ids:
+        changes['stock_data'] = []
+        return changes
+    query = STOCK_CHANGES_SQL.format(placeholders=_placeholders(item_ids))
+    changes['stock_data'] = [dict(row) for row in conn.execute(query, item_ids)]
+    return changes
+
+
+def get_purchase_rows(conn, purchase_ids):
+    purchase_ids = list(purchase_ids)
+    if not purchase_ids:
+        return []
+    query = PURCHASE_ROWS_SQL + f' WHERE p.id IN ({_placeholders(purchase_ids)}) ORDER BY p.id DESC'
+    return [dict(row) for row in conn.execute(query, purchase_ids)]
+
+
+def get_issue_rows(conn, issue_ids):
+    issue_ids = list(issue_ids)
+    if not issue_ids:
+        return []
+    query = ISSUE_ROWS_SQL + f' WHERE iss.id IN ({_placeholders(issue_ids)}) ORDER BY iss.id DESC'
+    return [dict(row) for row in conn.execute(query, issue_ids)]
+
+
+def _issue_failed(conn, message):
+    conn.rollback()
+    return {'success': False, 'message': message}, 400
+
+
+def issue_batch(conn, staff_id, date, remarks, site_id, lines):
+    """Issue several lines to one staff member in a single transaction.
+
+    Each line is a dict with category_id, subcategory_id, specs (the item id,
+    for subcategories with specs), serial_no and quantity; a negative quantity
+    returns a matching earlier issue. Every line is validated against stock
+    before anything is written, so the batch either commits as a whole or not
+    at all, together with its site ledger moves. Returns (payload, http
+    status); on success the payload carries the issue ids and item ids.
+    """
+    if not staff_id or not date:
+        return {'success': False, 'message': 'Department, Staff and Date are required!'}, 400
+    staff = get_staff(conn, staff_id)
+    if staff is None:
+        return {'success': False, 'message': 'Staff member not found!'}, 404
+    if get_site(site_id) is None:
+        return {'success': False, 'message': 'Unknown site selected.'}, 404
+    if not lines:
+        return {'success': False, 'message': 'Add at least one item to issue.'}, 400
+    for n, line in enumerate(lines, 1):
+        if not line['category_id'] or not line['subcategory_id'] or not line['quantity']:
+            return {'success': False, 'message': f'Line {n}: Category, Subcategory are required and quantity cannot be zero!'}, 400
+
+    subcategory_ids = sorted({line['subcategory_id'] for line in lines})
+    query = SPECS_REQUIRED_SQL.format(placeholders=_placeholders(subcategory_ids))
+    specs_required = {(str(r['category_id']), str(r['subcategory_id'])) for r in conn.execute(query, subcategory_ids)}
+
+    for n, line in enumerate(lines, 1):
+        if (str(line['category_id']), str(line['subcategory_id'])) in specs_required:
+            if not line['specs']:
+                return _issue_failed(conn, f'Line {n}: Specs selection is required for this item!')
+            line['item_id'] = int(line['specs'])
+        else:
+            # the canonical no-specs item, created on first use
+            line['item_id'] = resolve_item(conn, line['category_id'], line['subcategory_id'], None)
+
+    item_ids = sorted({line['item_id'] for line in lines})
+    query = ISSUE_ITEMS_SQL.format(placeholders=_placeholders(item_ids))
+    items = {r['id']: r for r in conn.execute(query, item_ids)}
+    for n, line in enumerate(lines, 1):
+        item = items.get(line['item_id'])
+        # specs carries a raw item id, so it must belong to the line's category and subcategory
+        if item is None or (str(item['category_id']), str(item['subcategory_id'])) != (str(line['category_id']), str(line['subcategory_id'])):
+            return _issue_failed(conn, f'Line {n}: Invalid item selected!')
+
+    # Requested totals per item and per serial, so two lines drawing on the
+    # same stock are checked together.
+    issued = [line for line in lines if line['quantity'] > 0]
+    wanted = {}
+    for line in issued:
+        for key in {(line['item_id'], ''), (line['item_id'], line['serial_no'])}:
+            wanted[key] = wanted.get(key, 0) + line['quantity']
+    if wanted:
+        keys = list(wanted)
+        query = ISSUE_AVAILABILITY_SQL.format(values=', '.join(['(?, ?)'] * len(keys)))
+        available = {(r['item_id'], r['serial_no']): r['available']
+                     for r in conn.execute(query, [v for key in keys for v in key])}
+        at_site = site_balances(site_id, {item_id for item_id, _ in keys}, conn)
+        for (item_id, serial_no), quantity in wanted.items():
+            name = items[item_id]['specs'] or items[item_id]['subcategory_name'] or ''
+            if quantity > available[(item_id, serial_no)]:
+                label = f'Serial No {serial_no}' if serial_no else name
+                return _issue_failed(conn, f'{label} has insufficient stock! Available: {available[(item_id, serial_no)]}, Requested: {quantity}')
+            if not serial_no and quantity > at_site.get(item_id, 0):
+                return _issue_failed(conn, f'{name} has insufficient stock at this site! Available: {at_site.get(item_id, 0)}, Requested: {quantity}')
+
+    returned = [line for line in lines if line['quantity'] < 0]
+    returns = []
+    moves = {}
+    if returned:
+        query = OPEN_ISSUES_SQL.format(placeholders=_placeholders(item_ids))
+        open_issues = conn.execute(query, staff_match_params(staff) + item_ids).fetchall()
+        taken = set()
+        for line in returned:
+            match = next((r for r in open_issues if r['id'] not in taken and r['item_id'] == line['item_id']
+                          and r['quantity'] == -line['quantity']), None)
+            if match is None:
+                return _issue_failed(conn, 'No matching issue found to return!')
+            taken.add(match['id'])
+            returns.append((remarks or f"Returned on {date}", date, match['id']))
+            # stock goes back to the site it was issued from
+            moves.setdefault(match['site_id'], []).append((line['item_id'], -line['quantity'], 'return', match['id'], date))
+        conn.executemany(RETURN_ISSUE_SQL, returns)
+
+    issue_ids = [r[2] for r in returns]
+    for line in issued:
+        item = items[line['item_id']]
+        item_name = item['specs'] or item['subcategory_name'] or item['category_name'] or ""
+        issue_id = conn.execute(INSERT_ISSUE_SQL, (None, line['item_id'], line['quantity'], date, item['specs'], remarks, staff['id'],
+                                                   staff['dept'], staff['name'], item_name, item['category_name'], item['subcategory_name'],
+                                                   line['serial_no'], site_id)).lastrowid
+        issue_ids.append(issue_id)
+        moves.setdefault(site_id, []).append((line['item_id'], -line['quantity'], 'issue', issue_id, date))
+
+    for move_site_id, site_moves in moves.items():
+        record_moves(conn, move_site_id, site_moves)
+    alerts_changed = evaluate_items(conn, item_ids)
+    conn.commit()
+    return {'success': True, 'issue_ids': issue_ids, 'item_ids': item_ids,
+            'issued': len(issued), 'returned': len(returns), 'alerts_changed': alerts_changed}, 200
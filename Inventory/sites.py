@@ -0,0 +1,490 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import argparse
+import logging
+import sqlite3
+import json
+import os
+
+import db
+from db import get_db_connection
+from responses import compact_response
+from writer import write
+
+# Multi-location support. Purchases and issues belong to a site, and each
+# site keeps a stock ledger (stock_moves) of signed quantity changes:
+# purchases and returns add stock, issues remove it, and a transfer is a
+# matching out/in pair. A site's balance is read from its ledger alone.
+#
+# Ledgers live in the main database by default. A site created as sharded
+# keeps its ledger in its own SQLite file under sites/, so stock lookups and
+# rollups for it never read or lock the main ledger; site_connection() is
+# the router that picks the right file. Cross-site rollups query every
+# ledger in parallel and merge the results.
+#
+# The purchase, issue and transfer records themselves always live in the
+# main database, and a shard is a copy derived from them. Moves are appended
+# to a shard only after the main transaction commits (conn.after_commit), so
+# a rolled-back write never reaches it. Stock checks inside a write read the
+# records, not the shard copy. If appending to a shard fails, a .stale marker
+# is left next to it and the next read rebuilds the shard from the records.
+
+sites_bp = Blueprint('sites', __name__, url_prefix='/sites')
+
+SHARD_DIR = 'sites'
+DEFAULT_SITE_ID = 1
+ROLLUP_WORKERS = 4
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS sites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        sharded INTEGER NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE IF NOT EXISTS transfers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        from_site_id INTEGER NOT NULL,
+        to_site_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        date TEXT NOT NULL,
+        remarks TEXT,
+        FOREIGN KEY (item_id) REFERENCES items (id),
+        FOREIGN KEY (from_site_id) REFERENCES sites (id),
+        FOREIGN KEY (to_site_id) REFERENCES sites (id)
+    )''',
+]
+
+LEDGER_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS stock_moves (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        site_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        ref_id INTEGER,
+        date TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_stock_moves_site_item ON stock_moves (site_id, item_id)',
+]
+
+# One move per record and kind, so re-appending after a rebuild is harmless.
+SHARD_SCHEMA = LEDGER_SCHEMA + [
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_moves_ref ON stock_moves (site_id, kind, ref_id)',
+]
+
+TRANSFER_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_transfers_from_item ON transfers (from_site_id, item_id)',
+    'CREATE INDEX IF NOT EXISTS idx_transfers_to_item ON transfers (to_site_id, item_id)',
+]
+
+SITE_COLUMNS = ['purchases', 'issues']
+
+INSERT_MOVE_SQL = 'INSERT INTO stock_moves (site_id, item_id, quantity, kind, ref_id, date) VALUES (?, ?, ?, ?, ?, ?)'
+
+APPEND_MOVE_SQL = INSERT_MOVE_SQL.replace('INSERT', 'INSERT OR IGNORE', 1)
+
+SITE_BALANCE_SQL = 'SELECT COALESCE(SUM(quantity), 0) FROM stock_moves WHERE site_id = ? AND item_id = ?'
+
+SITE_BALANCES_SQL = '''
+    SELECT site_id, item_id, SUM(quantity) as balance
+    FROM stock_moves
+    WHERE site_id IN ({placeholders})
+    GROUP BY site_id, item_id
+    HAVING SUM(quantity) <> 0
+'''
+
+# Ledger rows rebuilt from the documents in the main database.
+LEDGER_SOURCE_SQL = '''
+    SELECT item_id, quantity, 'purchase' as kind, id as ref_id, date FROM purchases
+    WHERE site_id = :site AND item_id IS NOT NULL
+    UNION ALL
+    SELECT item_id, -quantity, 'issue', id, date FROM issues
+    WHERE site_id = :site AND item_id IS NOT NULL AND is_return IN (0, 1)
+    UNION ALL
+    SELECT item_id, quantity, 'return', id, return_date FROM issues
+    WHERE site_id = :site AND item_id IS NOT NULL AND is_return = 1
+    UNION ALL
+    SELECT item_id, -quantity, 'transfer_out', id, date FROM transfers WHERE from_site_id = :site
+    UNION ALL
+    SELECT item_id, quantity, 'transfer_in', id, date FROM transfers WHERE to_site_id = :site
+'''
+
+# A sharded site's balances computed from the records in the main database.
+RECORD_BALANCES_SQL = 'SELECT item_id, SUM(quantity) FROM (' + LEDGER_SOURCE_SQL + ''')
+    WHERE item_id IN ({placeholders})
+    GROUP BY item_id
+'''
+
+ITEM_NAMES_SQL = '''
+    SELECT i.id, c.name as category, s.name as subcategory, i.specs
+    FROM items i
+    LEFT JOIN categories c ON i.category_id = c.id
+    LEFT JOIN subcategories s ON i.subcategory_id = s.id
+'''
+
+_sites = {}
+_sites_lock = threading.Lock()
+_shard_schema_ready = set()
+_rollup_executor = None
+
+
+def _has_column(conn, table, column):
+    return any(r[1] == column for r in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def init_sites(conn):
+    """Create the site tables, add site_id to purchases/issues and seed the main site."""
+    for statement in SCHEMA + LEDGER_SCHEMA + TRANSFER_INDEXES:
+        conn.execute(statement)
+    for table in SITE_COLUMNS:
+        if not _has_column(conn, table, 'site_id'):
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN site_id INTEGER NOT NULL DEFAULT {DEFAULT_SITE_ID}')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_site_item ON {table} (site_id, item_id)')
+    if not conn.execute('SELECT 1 FROM sites').fetchone():
+        conn.execute('INSERT INTO sites (id, code, name) VALUES (?, ?, ?)', (DEFAULT_SITE_ID, 'MAIN', 'Main office'))
+        # existing stock all belongs to the main site
+        conn.executemany(INSERT_MOVE_SQL, _ledger_rows(conn, DEFAULT_SITE_ID))
+    conn.commit()
+
+
+def _load_sites():
+    conn = get_db_connection()
+    rows = conn.execute('SELECT id, code, name, sharded FROM sites ORDER BY id').fetchall()
+    conn.close()
+    with _sites_lock:
+        _sites.clear()
+        _sites.update({r['id']: dict(r) for r in rows})
+
+
+def get_site(site_id):
+    """Site row by id, or None (also for ids that are not numbers). Cached per process; reloaded on a miss."""
+    try:
+        site_id = int(site_id)
+    except (TypeError, ValueError):
+        return None
+    if site_id not in _sites:
+        _load_sites()
+    return _sites.get(site_id)
+
+
+def list_sites():
+    _load_sites()
+    return list(_sites.values())
+
+
+def shard_path(site):
+    return os.path.join(SHARD_DIR, f"{site['code'].lower()}.db")
+
+
+def _stale_marker(site):
+    return shard_path(site) + '.stale'
+
+
+def site_connection(site_id):
+    """Connection holding `site_id`'s stock ledger: its shard file, or the main database."""
+    site = get_site(site_id)
+    if site is None:
+        raise ValueError(f'Unknown site: {site_id}')
+    if not site['sharded']:
+        return get_db_connection()
+
+    path = shard_path(site)
+    fresh = path not in _shard_schema_ready
+    if fresh:
+        os.makedirs(SHARD_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if fresh:
+        conn.execute('PRAGMA journal_mode = WAL')
+        for statement in SHARD_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        _shard_schema_ready.add(path)
+    return conn
+
+
+def record_moves(conn, site_id, moves):
+    """Append `moves` [(item_id, quantity, kind, ref_id, date)] to a site's ledger.
+
+    Call from the writer job that records the purchase/issue/transfer.
+    Unsharded sites write through `conn`, so the moves commit (or roll back)
+    with it; sharded sites are appended to once the job has committed.
+    """
+    rows = [(int(site_id), item_id, quantity, kind, ref_id, date) for item_id, quantity, kind, ref_id, date in moves]
+    if not rows:
+        return
+    site = get_site(site_id)
+    if site is None:
+        raise ValueError(f'Unknown site: {site_id}')
+    if not site['sharded']:
+        conn.executemany(INSERT_MOVE_SQL, rows)
+        return
+    conn.after_commit(lambda: _append_to_shard(site_id, rows))
+
+
+def _append_to_shard(site_id, rows):
+    try:
+        shard = site_connection(site_id)
+        try:
+            shard.executemany(APPEND_MOVE_SQL, rows)
+            shard.commit()
+        finally:
+            shard.close()
+    except sqlite3.Error as e:
+        logging.error(f"Could not append {len(rows)} moves to the ledger of site {site_id}; marking it stale: {e}")
+        open(_stale_marker(get_site(site_id)), 'a').close()
+
+
+def _refresh_if_stale(site_id):
+    site = get_site(site_id)
+    if site['sharded'] and os.path.exists(_stale_marker(site)):
+        logging.warning(f"Rebuilding the stale ledger of site {site['code']}")
+        rebuild_ledger(site_id)
+
+
+def _ledger_reader(site_id, conn):
+    """(connection, owned) to read a site's ledger. Unsharded sites read
+    through `conn` when given, so a check sees moves written earlier in the
+    same transaction."""
+    if conn is not None and not get_site(site_id)['sharded']:
+        return conn, False
+    _refresh_if_stale(site_id)
+    return site_connection(site_id), True
+
+
+def site_balance(site_id, item_id, conn=None):
+    return site_balances(site_id, [item_id], conn).get(item_id, 0)
+
+
+def site_balances(site_id, item_ids, conn=None):
+    """{item_id: balance} at `site_id` for several items in one query.
+
+    Inside a write (`conn` given) a sharded site is checked against the
+    records in the main database, which the write transaction holds locked;
+    its shard only catches up after the commit.
+    """
+    item_ids = sorted(item_ids)
+    if not item_ids:
+        return {}
+    placeholders = ', '.join('?' * len(item_ids))
+    if conn is not None and get_site(site_id)['sharded']:
+        names = {f'item{n}': item_id for n, item_id in enumerate(item_ids)}
+        query = RECORD_BALANCES_SQL.format(placeholders=', '.join(f':{name}' for name in names))
+        rows = conn.execute(query, dict(names, site=int(site_id))).fetchall()
+        return {item_id: balance for item_id, balance in rows}
+    reader, owned = _ledger_reader(site_id, conn)
+    rows = reader.execute(f'''
+        SELECT item_id, SUM(quantity) FROM stock_moves
+        WHERE site_id = ? AND item_id IN ({placeholders})
+        GROUP BY item_id
+    ''', [int(site_id)] + item_ids).fetchall()
+    if owned:
+        reader.close()
+    return {item_id: balance for item_id, balance in rows}
+
+
+def _ledger_rows(conn, site_id):
+    return [(site_id, r['item_id'], r['quantity'], r['kind'], r['ref_id'], r['date'])
+            for r in conn.execute(LEDGER_SOURCE_SQL, {'site': site_id})]
+
+
+def rebuild_ledger(site_id):
+    """Recompute a site's ledger from the purchase, issue and transfer records."""
+    site = get_site(site_id)
+    if site['sharded'] and os.path.exists(_stale_marker(site)):
+        # cleared first: an append that fails from here on marks it again
+        os.remove(_stale_marker(site))
+    target = site_connection(site_id)
+    try:
+        # Hold the ledger's write lock while reading the records, so a move
+        # appended meanwhile lands after the rebuild (and is ignored if the
+        # rebuild already has it).
+        target.execute('BEGIN IMMEDIATE')
+        conn = get_db_connection()
+        rows = _ledger_rows(conn, int(site_id))
+        conn.close()
+        target.execute('DELETE FROM stock_moves WHERE site_id = ?', (int(site_id),))
+        target.executemany(INSERT_MOVE_SQL, rows)
+        target.commit()
+    finally:
+        target.close()
+    return len(rows)
+
+
+def _query_ledger(site_ids):
+    # All of the given sites live in the same ledger file.
+    _refresh_if_stale(site_ids[0])
+    conn = site_connection(site_ids[0])
+    try:
+        placeholders = ', '.join('?' * len(site_ids))
+        return [tuple(r) for r in conn.execute(SITE_BALANCES_SQL.format(placeholders=placeholders), site_ids)]
+    finally:
+        conn.close()
+
+
+def _get_rollup_executor():
+    global _rollup_executor
+    if _rollup_executor is None:
+        _rollup_executor = ThreadPoolExecutor(max_workers=ROLLUP_WORKERS, thread_name_prefix='site-rollup')
+    return _rollup_executor
+
+
+def stock_by_site():
+    """Per-item stock at every site, queried from all ledgers in parallel.
+
+    Returns (sites, rows) where each row has the item's names, a
+    {site_id: balance} map and the total across sites.
+    """
+    sites = list_sites()
+    # one query for all unsharded sites, one per shard
+    groups = [[s['id'] for s in sites if not s['sharded']]] + [[s['id']] for s in sites if s['sharded']]
+    groups = [g for g in groups if g]
+
+    balances = {}
+    for result in _get_rollup_executor().map(_query_ledger, groups):
+        for site_id, item_id, balance in result:
+            balances.setdefault(item_id, {})[site_id] = balance
+
+    rows = []
+    if balances:
+        conn = get_db_connection()
+        names = {r['id']: r for r in conn.execute(ITEM_NAMES_SQL)}
+        conn.close()
+        for item_id, per_site in balances.items():
+            name = names.get(item_id)
+            rows.append({
+                'item_id': item_id,
+                'category': name['category'] if name else None,
+                'subcategory': name['subcategory'] if name else None,
+                'specs': name['specs'] if name else None,
+                'sites': per_site,
+                'total': sum(per_site.values()),
+            })
+        rows.sort(key=lambda r: (r['category'] or '', r['subcategory'] or '', r['specs'] or ''))
+    return sites, rows
+
+
+def add_site(conn, code, name, sharded=False):
+    code = (code or '').strip().upper()
+    name = (name or '').strip()
+    if not code or not name:
+        return {'success': False, 'message': 'Site code and name are required'}, 400
+    if not code.isalnum():
+        return {'success': False, 'message': 'Site code must be letters and digits only'}, 400
+    try:
+        site_id = conn.execute('INSERT INTO sites (code, name, sharded) VALUES (?, ?, ?)',
+                               (code, name, 1 if sharded else 0)).lastrowid
+        conn.commit()
+    except sqlite3.IntegrityError:
+        return {'success': False, 'message': 'A site with this code already exists'}, 409
+    return {'success': True, 'id': site_id, 'code': code, 'name': name}, 201
+
+
+def transfer(conn, item_id, from_site_id, to_site_id, quantity, date, remarks=''):
+    """Move stock between sites; returns (payload, status)."""
+    try:
+        item_id, from_site_id, to_site_id, quantity = int(item_id), int(from_site_id), int(to_site_id), int(quantity)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': 'Item, sites and quantity are required'}, 400
+    if from_site_id == to_site_id:
+        return {'success': False, 'message': 'Source and destination sites must differ'}, 400
+    if quantity <= 0:
+        return {'success': False, 'message': 'Quantity must be positive'}, 400
+    if get_site(from_site_id) is None or get_site(to_site_id) is None:
+        return {'success': False, 'message': 'Unknown site'}, 404
+    available = site_balance(from_site_id, item_id, conn)
+    if quantity > available:
+        return {'success': False, 'message': f'Insufficient stock at source site! Available: {available}, Requested: {quantity}'}, 409
+
+    date = date or datetime.now().strftime('%Y-%m-%d')
+    transfer_id = conn.execute(
+        'INSERT INTO transfers (item_id, from_site_id, to_site_id, quantity, date, remarks) VALUES (?, ?, ?, ?, ?, ?)',
+        (item_id, from_site_id, to_site_id, quantity, date, remarks)).lastrowid
+    record_moves(conn, from_site_id, [(item_id, -quantity, 'transfer_out', transfer_id, date)])
+    record_moves(conn, to_site_id, [(item_id, quantity, 'transfer_in', transfer_id, date)])
+    conn.commit()
+    return {'success': True, 'id': transfer_id}, 201
+
+
+@sites_bp.route('')
+def index():
+    if 'user_id' not in session:
+        flash('You need to be logged in to view this page.', 'warning')
+        return redirect(url_for('auth.login'))
+    sites, rows = stock_by_site()
+    conn = get_db_connection()
+    transfers = conn.execute('''
+        SELECT t.id, t.date, t.quantity, t.remarks, fs.code as from_code, ts.code as to_code,
+               c.name as category, s.name as subcategory, i.specs
+        FROM transfers t
+        JOIN sites fs ON t.from_site_id = fs.id
+        JOIN sites ts ON t.to_site_id = ts.id
+        JOIN items i ON t.item_id = i.id
+        LEFT JOIN categories c ON i.category_id = c.id
+        LEFT JOIN subcategories s ON i.subcategory_id = s.id
+        ORDER BY t.id DESC LIMIT 50
+    ''').fetchall()
+    conn.close()
+    return render_template('sites.html', sites=sites, stock_rows=rows, transfers=transfers)
+
+
+@sites_bp.route('', methods=['POST'])
+def create():
+    if session.get('role') != 'admin':
+        flash('Access denied: Admins only.', 'danger')
+        return redirect(url_for('sites.index'))
+    payload, status = write(add_site, request.form.get('code'), request.form.get('name'), request.form.get('sharded') == 'on')
+    _load_sites()
+    flash('Site added successfully!' if payload['success'] else payload['message'], 'success' if payload['success'] else 'danger')
+    return redirect(url_for('sites.index'))
+
+
+@sites_bp.route('/transfers', methods=['POST'])
+def create_transfer():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    data = request.get_json(silent=True) or request.form
+    try:
+        payload, status = write(transfer, data.get('item_id'), data.get('from_site_id'), data.get('to_site_id'),
+                                data.get('quantity'), data.get('date'), data.get('remarks', ''))
+    except sqlite3.Error as e:
+        logging.error(f'Error recording transfer: {e}')
+        payload, status = {'success': False, 'message': str(e)}, 500
+    if request.is_json:
+        return jsonify(payload), status
+    flash('Transfer recorded successfully!' if payload['success'] else payload['message'], 'success' if payload['success'] else 'danger')
+    return redirect(url_for('sites.index'))
+
+
+@sites_bp.route('/stock')
+def stock():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    sites, rows = stock_by_site()
+    return compact_response({'sites': sites, 'stock': rows})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inventory site ledgers')
+    parser.add_argument('command', choices=['list', 'rebuild', 'rollup'])
+    parser.add_argument('--site', type=int, help='site id for rebuild (default: every site)')
+    parser.add_argument('--database', default=db.DATABASE, help='path to the SQLite database')
+    args = parser.parse_args(argv)
+    db.DATABASE = args.database
+
+    if args.command == 'list':
+        result = list_sites()
+    elif args.command == 'rebuild':
+        site_ids = [args.site] if args.site else [s['id'] for s in list_sites()]
+        result = {site_id: rebuild_ledger(site_id) for site_id in site_ids}
+    else:
+        result = stock_by_site()[1]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
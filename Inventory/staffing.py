@@ -0,0 +1,143 @@
+import logging
+
+# Issues point at the staff member they were issued to through issues.staff_id.
+# The department and staff_name text on each issue is only a display copy:
+# update_staff refreshes it on every edit, and lookups, joins and return
+# matching all go through staff_id and its index instead of the name text.
+# The one exception is legacy issues the migration could not link: they keep
+# staff_id NULL and still belong to whoever matches their name and department
+# (STAFF_MATCH_SQL), so holdings, history and returns keep finding them.
+
+STAFF_ID_INDEX = 'idx_issues_staff_id'
+
+# Backfill, most specific match first: same name in the same department, then
+# the name alone where exactly one staff member has it.
+BACKFILL_SQL = [
+    '''
+    UPDATE issues SET staff_id = (
+        SELECT MIN(st.id) FROM staff st
+        WHERE LOWER(TRIM(st.name)) = LOWER(TRIM(issues.staff_name))
+          AND LOWER(TRIM(st.dept)) = LOWER(TRIM(issues.department))
+    ) WHERE staff_id IS NULL
+    ''',
+    '''
+    UPDATE issues SET staff_id = (
+        SELECT CASE WHEN COUNT(*) = 1 THEN MIN(st.id) END FROM staff st
+        WHERE LOWER(TRIM(st.name)) = LOWER(TRIM(issues.staff_name))
+    ) WHERE staff_id IS NULL
+    ''',
+]
+
+STAFF_SQL = 'SELECT id, dept, name, designation, date_of_joining FROM staff WHERE id = ?'
+
+# Filter on issues (column prefix {p}) belonging to a staff member; takes
+# staff_match_params(staff). Unlinked rows are found through the staff_id
+# index's NULL entries, so the name comparison only runs over those.
+STAFF_MATCH_SQL = '''({p}staff_id = ? OR ({p}staff_id IS NULL
+    AND LOWER(TRIM({p}staff_name)) = LOWER(TRIM(?)) AND LOWER(TRIM({p}department)) = LOWER(TRIM(?))))'''
+
+FIND_STAFF_SQL = '''
+    SELECT MIN(id) FROM staff
+    WHERE LOWER(TRIM(name)) = LOWER(TRIM(?)) AND LOWER(TRIM(dept)) = LOWER(TRIM(?))
+'''
+
+STAFF_ISSUES_SQL = '''
+    SELECT iss.id, iss.item_id, iss.quantity, iss.date, iss.serial_no, iss.site_id, iss.remarks,
+           iss.is_return, iss.return_date, iss.return_reason,
+           c.name as category, s.name as subcategory, i.specs
+    FROM issues iss
+    JOIN items i ON iss.item_id = i.id
+    LEFT JOIN categories c ON i.category_id = c.id
+    LEFT JOIN subcategories s ON i.subcategory_id = s.id
+    WHERE ''' + STAFF_MATCH_SQL.format(p='iss.') + '''
+'''
+
+# The staff member an issue (aliased iss) belongs to, for joins: its link, or
+# for an unlinked legacy row the staff member matching its name and
+# department, as in STAFF_MATCH_SQL. The subquery only runs for NULL links.
+ISSUE_STAFF_ID_SQL = '''COALESCE(iss.staff_id, (
+    SELECT MIN(named.id) FROM staff named
+    WHERE LOWER(TRIM(named.name)) = LOWER(TRIM(iss.staff_name))
+      AND LOWER(TRIM(named.dept)) = LOWER(TRIM(iss.department))))'''
+
+HOLDINGS_SQL = STAFF_ISSUES_SQL + ' AND COALESCE(iss.is_return, 0) = 0 ORDER BY iss.id DESC'
+
+HISTORY_SQL = STAFF_ISSUES_SQL + ' ORDER BY iss.id DESC'
+
+
+def _has_column(conn, table, column):
+    return any(r[1] == column for r in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def migrate_issue_staff(conn):
+    """One-time migration: add issues.staff_id, backfill it from the name text and index it.
+
+    Issues whose name matches no staff member (or several, in different
+    departments) keep staff_id NULL and their text. Safe to call on every
+    startup; it does nothing once the index exists.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (STAFF_ID_INDEX,)).fetchone():
+        return 0
+
+    if not _has_column(conn, 'issues', 'staff_id'):
+        conn.execute('ALTER TABLE issues ADD COLUMN staff_id INTEGER REFERENCES staff (id)')
+    for statement in BACKFILL_SQL:
+        conn.execute(statement)
+    conn.execute(f'CREATE INDEX {STAFF_ID_INDEX} ON issues (staff_id, item_id)')
+    conn.commit()
+    unmatched = conn.execute('SELECT COUNT(*) FROM issues WHERE staff_id IS NULL').fetchone()[0]
+    if unmatched:
+        logging.warning(f'{unmatched} issues match no single staff member; they stay matched by their name text')
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for row in conn.execute('SELECT id, department, staff_name FROM issues WHERE staff_id IS NULL ORDER BY id'):
+                logging.debug(f"Unlinked issue {row['id']}: {row['staff_name']!r} in {row['department']!r}")
+    return unmatched
+
+
+def get_staff(conn, staff_id):
+    return conn.execute(STAFF_SQL, (staff_id,)).fetchone()
+
+
+def staff_match_params(staff):
+    """Parameters for STAFF_MATCH_SQL from a staff row."""
+    return [staff['id'], staff['name'], staff['dept']]
+
+
+def find_staff_id(conn, department, name):
+    """Staff id for a department and name as typed, or None."""
+    return conn.execute(FIND_STAFF_SQL, (name, department)).fetchone()[0]
+
+
+def holdings(conn, staff):
+    """Everything currently issued to the `staff` row and not yet returned."""
+    return [dict(row) for row in conn.execute(HOLDINGS_SQL, staff_match_params(staff))]
+
+
+def history(conn, staff):
+    """Every issue and return for the `staff` row, newest first."""
+    return [dict(row) for row in conn.execute(HISTORY_SQL, staff_match_params(staff))]
+
+
+def update_staff(conn, staff_id, name, designation, date_of_joining, dept):
+    """Edit a staff member and refresh the display copy on their issues."""
+    conn.execute('UPDATE staff SET name = ?, designation = ?, date_of_joining = ?, dept = ? WHERE id = ?',
+                 (name, designation, date_of_joining, dept, staff_id))
+    conn.execute('UPDATE issues SET staff_name = ?, department = ? WHERE staff_id = ?', (name, dept, staff_id))
+    conn.commit()
+
+
+def delete_staff(conn, staff_id):
+    """Delete a staff member who holds nothing. Returns (payload, http status).
+
+    Their past issues keep staff_id, so they are never matched by name to a
+    later hire with the same name and department.
+    """
+    staff = get_staff(conn, staff_id)
+    if staff is None:
+        return {'success': False, 'message': 'Staff member not found!'}, 404
+    held = len(holdings(conn, staff))
+    if held:
+        return {'success': False, 'message': f"{staff['name']} still holds {held} issued item(s); return them before deleting."}, 409
+    conn.execute('DELETE FROM staff WHERE id = ?', (staff_id,))
+    conn.commit()
+    return {'success': True, 'message': 'Staff deleted successfully!'}, 200
@@ -0,0 +1,262 @@
+// Staff and serial pickers are filled from /api/autocomplete: the first
+// matches when a department or item is chosen, then narrowed as the user
+// types, instead of downloading every staff member or serial up front.
+const AUTOCOMPLETE_DELAY_MS = 200;
+const PICKER_LIMIT = 50;
+
+function autocomplete(params) {
+    return fetch(`/api/autocomplete?${new URLSearchParams(Object.assign({limit: PICKER_LIMIT}, params))}`)
+        .then(response => response.json());
+}
+
+// Runs fn after the user pauses typing in `element`.
+function debounced(element, fn) {
+    clearTimeout(element.autocompleteTimer);
+    element.autocompleteTimer = setTimeout(fn, AUTOCOMPLETE_DELAY_MS);
+}
+
+// Fills `select` with the results of `request`, ignoring responses that
+// arrive after a newer request for the same select.
+function fillPicker(select, placeholder, request, toOption) {
+    const token = (select.pickerToken || 0) + 1;
+    select.pickerToken = token;
+    return request.then(data => {
+        if (select.pickerToken !== token) return null;
+        resetSelect(select, placeholder);
+        data.forEach(row => select.appendChild(toOption(row)));
+        return data;
+    });
+}
+
+function fillStaff() {
+    const department = document.getElementById('department').value;
+    const staffSelect = document.getElementById('staff_name');
+    if (!department) {
+        staffSelect.pickerToken = (staffSelect.pickerToken || 0) + 1;
+        resetSelect(staffSelect, 'Choose staff member...');
+        return;
+    }
+    const query = document.getElementById('staff_search').value;
+    fillPicker(staffSelect, 'Choose staff member...', autocomplete({type: 'staff', department: department, q: query}),
+        staff => new Option(`${staff.name} (${staff.designation})`, staff.id));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const departmentSelect = document.getElementById('department');
+
+    fetch('/api/get_departments')
+        .then(response => response.json())
+        .then(data => {
+            data.forEach(dept => {
+                const option = document.createElement('option');
+                option.value = dept;
+                option.textContent = dept;
+                departmentSelect.appendChild(option);
+            });
+        });
+
+    fillCategories(document.querySelector('.issue-item'));
+});
+
+document.getElementById('department').addEventListener('change', function() {
+    document.getElementById('staff_search').value = '';
+    fillStaff();
+});
+
+document.getElementById('staff_search').addEventListener('input', function() {
+    debounced(this, fillStaff);
+});
+
+let purchaseCategories = null;
+
+function fillCategories(line) {
+    const categorySelect = line.querySelector('.category-select');
+    const load = purchaseCategories || fetch('/api/get_purchase_categories').then(response => response.json());
+    purchaseCategories = load;
+    load.then(data => {
+        data.forEach(cat => {
+            const option = document.createElement('option');
+            option.value = cat.id;
+            option.textContent = cat.name;
+            categorySelect.appendChild(option);
+        });
+    });
+}
+
+function resetSelect(select, placeholder) {
+    select.innerHTML = `<option value="">${placeholder}</option>`;
+}
+
+function hideSpecsAndSerials(line) {
+    const specsSelect = line.querySelector('.specs-select');
+    const serialSelect = line.querySelector('.serial-select');
+    resetSelect(specsSelect, 'Choose specs...');
+    resetSelect(serialSelect, 'Choose serial no...');
+    serialSelect.pickerToken = (serialSelect.pickerToken || 0) + 1;
+    line.serialFilter = null;
+    line.querySelector('.serial-search').value = '';
+    line.querySelector('.specs-wrapper').style.display = 'none';
+    line.querySelector('.serial-wrapper').style.display = 'none';
+    specsSelect.required = false;
+    serialSelect.required = false;
+}
+
+function fillSerials(line) {
+    const query = line.querySelector('.serial-search').value;
+    return fillPicker(line.querySelector('.serial-select'), 'Choose serial no...',
+        autocomplete(Object.assign({type: 'serial', q: query}, line.serialFilter)),
+        serial => new Option(serial.serial_no, serial.serial_no));
+}
+
+// `filter` is {subcategory_id} or {item_id}; the picker only shows when
+// there are serials to choose from.
+function showSerials(line, filter) {
+    const serialWrapper = line.querySelector('.serial-wrapper');
+    const serialSelect = line.querySelector('.serial-select');
+    line.serialFilter = filter;
+    fillSerials(line).then(data => {
+        if (data === null) return;
+        const hasSerials = data.length > 0;
+        serialWrapper.style.display = hasSerials ? '' : 'none';
+        serialSelect.required = hasSerials;
+    });
+}
+
+function onCategoryChange(line) {
+    const categoryId = line.querySelector('.category-select').value;
+    const subSelect = line.querySelector('.subcategory-select');
+    resetSelect(subSelect, 'Choose subcategory...');
+    hideSpecsAndSerials(line);
+
+    if (!categoryId) return;
+
+    fetch(`/api/get_purchase_subcategories/${categoryId}`)
+        .then(response => response.json())
+        .then(data => {
+            data.forEach(sub => {
+                subSelect.innerHTML += `<option value="${sub.id}">${sub.name}</option>`;
+            });
+        });
+}
+
+function onSubcategoryChange(line) {
+    const subcategoryId = line.querySelector('.subcategory-select').value;
+    const specsSelect = line.querySelector('.specs-select');
+    hideSpecsAndSerials(line);
+
+    if (!subcategoryId) return;
+
+    // 1. Check for specs
+    fetch(`/api/get_purchase_specs/${subcategoryId}`)
+        .then(response => response.json())
+        .then(specsData => {
+            if (Array.isArray(specsData) && specsData.length > 0) {
+                // Specs exist
+                specsData.forEach(spec => {
+                    specsSelect.innerHTML += `<option value="${spec.id}">${spec.specs}</option>`;
+                });
+                line.querySelector('.specs-wrapper').style.display = '';
+                specsSelect.required = true;
+            } else {
+                // No specs, check for serials directly
+                showSerials(line, {subcategory_id: subcategoryId});
+            }
+        });
+}
+
+function onSpecsChange(line) {
+    const specsId = line.querySelector('.specs-select').value;
+    const serialSelect = line.querySelector('.serial-select');
+    resetSelect(serialSelect, 'Choose serial no...');
+    serialSelect.pickerToken = (serialSelect.pickerToken || 0) + 1;
+    line.querySelector('.serial-search').value = '';
+    line.querySelector('.serial-wrapper').style.display = 'none';
+    serialSelect.required = false;
+
+    if (!specsId) return;
+
+    // Serial numbers for the selected specs
+    showSerials(line, {item_id: specsId});
+}
+
+function updateReturnStatus(line) {
+    const quantity = parseInt(line.querySelector('.quantity-input').value) || 0;
+    line.querySelector('.return-status').textContent = quantity < 0 ? 'Returning' : 'Issuing';
+}
+
+function resetLine(line) {
+    line.querySelectorAll('select').forEach(select => {
+        select.innerHTML = select.options.length ? `<option value="">${select.options[0].textContent}</option>` : '';
+    });
+    line.querySelector('.quantity-input').value = '1';
+    hideSpecsAndSerials(line);
+    updateReturnStatus(line);
+}
+
+const issueGroup = document.getElementById('issue-group');
+
+issueGroup.addEventListener('change', function(e) {
+    const line = e.target.closest('.issue-item');
+    if (e.target.classList.contains('category-select')) {
+        onCategoryChange(line);
+    } else if (e.target.classList.contains('subcategory-select')) {
+        onSubcategoryChange(line);
+    } else if (e.target.classList.contains('specs-select')) {
+        onSpecsChange(line);
+    }
+});
+
+issueGroup.addEventListener('input', function(e) {
+    const line = e.target.closest('.issue-item');
+    if (e.target.classList.contains('quantity-input')) {
+        updateReturnStatus(line);
+    } else if (e.target.classList.contains('serial-search') && line.serialFilter) {
+        debounced(e.target, () => fillSerials(line));
+    }
+});
+
+issueGroup.addEventListener('click', function(e) {
+    if (!e.target.closest('.remove-item')) return;
+    const line = e.target.closest('.issue-item');
+    if (issueGroup.querySelectorAll('.issue-item').length > 1) {
+        line.remove();
+    } else {
+        // Reset the last line instead of removing it
+        resetLine(line);
+        fillCategories(line);
+    }
+});
+
+document.getElementById('add-issue-item').addEventListener('click', function() {
+    const clone = issueGroup.querySelector('.issue-item').cloneNode(true);
+    resetLine(clone);
+    fillCategories(clone);
+    issueGroup.appendChild(clone);
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+    const searchInput = document.getElementById('issue-search');
+    const issueTable = document.querySelector('.issue-table');
+
+    if (searchInput && issueTable) {
+        const rows = issueTable.querySelectorAll('tbody tr');
+
+        searchInput.addEventListener('input', function(e) {
+            const query = e.target.value.toLowerCase();
+            rows.forEach(row => {
+                const department = row.cells[1]?.textContent.toLowerCase() || '';
+                const staffName = row.cells[2]?.textContent.toLowerCase() || '';
+                const category = row.cells[3]?.textContent.toLowerCase() || '';
+                const subcategory = row.cells[4]?.textContent.toLowerCase() || '';
+                const specs = row.cells[5]?.textContent.toLowerCase() || '';
+                const matches =
+                    department.includes(query) ||
+                    staffName.includes(query) ||
+                    category.includes(query) ||
+                    subcategory.includes(query) ||
+                    specs.includes(query);
+                row.style.display = matches ? '' : 'none';
+            });
+        });
+    }
+});
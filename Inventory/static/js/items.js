@@ -0,0 +1,41 @@
+function toggleCustomCategory(select) {
+    const input = document.getElementById('customCategoryInput');
+    input.classList.toggle('d-none', select.value !== 'custom');
+}
+
+function toggleCustomSubcategory(select) {
+    const input = document.getElementById('customSubcategoryInput');
+    input.classList.toggle('d-none', select.value !== 'custom');
+}
+
+document.querySelector('#categoryDropdown').addEventListener('change', function () {
+    const categoryId = this.value;
+    const subcategorySelect = document.getElementById('subcategoryDropdown');
+
+    if (categoryId === 'custom') {
+        subcategorySelect.innerHTML = '<option value="custom" selected>Add New Subcategory</option>';
+        toggleCustomSubcategory(subcategorySelect);
+        return;
+    }
+
+    // Clear existing options
+    subcategorySelect.innerHTML = '<option value="">Loading...</option>';
+
+    // FIX: Add '/api' prefix to the URL
+    fetch(`/api/get_subcategories/${categoryId}`)
+        .then(response => response.json())
+        .then(data => {
+            subcategorySelect.innerHTML = '<option value="" disabled selected>Select Subcategory</option>';
+            data.forEach(sub => {
+                const option = document.createElement('option');
+                option.value = sub.id;
+                option.textContent = sub.name;
+                subcategorySelect.appendChild(option);
+            });
+            subcategorySelect.innerHTML += '<option value="custom">Add New Subcategory</option>';
+        })
+        .catch(error => {
+            console.error('Error fetching subcategories:', error);
+            subcategorySelect.innerHTML = '<option value="">Error loading subcategories</option>';
+        });
+});
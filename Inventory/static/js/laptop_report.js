@@ -0,0 +1,42 @@
+function showFilterInput() {
+    const filterBy = document.getElementById('filter_by').value;
+    const textFilter = document.getElementById('textFilter');
+    const dateFilter = document.getElementById('dateFilter');
+    const filterInputContainer = document.getElementById('filterInputContainer');
+
+    // Show/hide filter containers
+    filterInputContainer.style.display = filterBy === 'All' ? 'none' : 'block';
+
+    // Clear previous values
+    document.getElementById('filterValue').value = '';
+    document.getElementById('filterDate').value = '';
+
+    // Show appropriate filter type
+    if (['Users', 'Department', 'Specs', 'Serial No'].includes(filterBy)) {
+        textFilter.style.display = 'flex';
+        dateFilter.style.display = 'none';
+    } else if (['Date of Purchase', 'Issue Date', 'Employee Joining Date'].includes(filterBy)) {
+        textFilter.style.display = 'none';
+        dateFilter.style.display = 'flex';
+    } else {
+        textFilter.style.display = 'none';
+        dateFilter.style.display = 'none';
+    }
+}
+
+// Initialize on page load and maintain selected values
+document.addEventListener('DOMContentLoaded', function() {
+    showFilterInput();
+
+    // Maintain selected values after form submission
+    const urlParams = new URLSearchParams(window.location.search);
+    const filterBy = urlParams.get('filter_by');
+    if (filterBy) {
+        document.getElementById('filter_by').value = filterBy;
+        if (['Users', 'Department', 'Specs', 'Serial No'].includes(filterBy)) {
+            document.getElementById('filterValue').value = urlParams.get('filter_value') || '';
+        } else if (['Date of Purchase', 'Issue Date', 'Employee Joining Date'].includes(filterBy)) {
+            document.getElementById('filterDate').value = urlParams.get('filter_date') || '';
+        }
+    }
+});
@@ -0,0 +1,224 @@
+// Live table updates over server-sent events. Pages opt in by marking a
+// table with data-live="stock|issue|purchase"; the server pushes the changed
+// rows after each write and they are patched in place, along with the
+// low-stock badge. Other pages keep a stream slot free and refresh the badge
+// from /api/alerts instead.
+(function() {
+    const RECONNECT_DELAY_MS = 30000;
+    const ALERTS_POLL_MS = 60000;
+
+    const liveTables = document.querySelectorAll('[data-live]');
+    if (!liveTables.length || !window.EventSource) {
+        if (document.getElementById('low-stock-badge')) {
+            setInterval(pollAlerts, ALERTS_POLL_MS);
+        }
+        return;
+    }
+
+    const MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                    'August', 'September', 'October', 'November', 'December'];
+
+    // Mirrors the dateformat Jinja filter: 2025-09-09 -> 09 September, 2025
+    function formatDate(value) {
+        const match = /^(\d{4})-(\d{2})-(\d{2})$/.exec(value || '');
+        if (!match) {
+            return value || '';
+        }
+        return `${match[3]} ${MONTHS[parseInt(match[2], 10) - 1]}, ${match[1]}`;
+    }
+
+    function cell(content) {
+        const td = document.createElement('td');
+        if (content instanceof Node) {
+            td.appendChild(content);
+        } else {
+            td.textContent = content === null || content === undefined || content === '' ? '—' : content;
+        }
+        return td;
+    }
+
+    function badge(className, text, style) {
+        const span = document.createElement('span');
+        span.className = className;
+        span.textContent = text;
+        if (style) {
+            span.setAttribute('style', style);
+        }
+        return span;
+    }
+
+    function setText(id, value) {
+        const el = document.getElementById(id);
+        if (el) {
+            el.textContent = value;
+        }
+    }
+
+    function flash(row) {
+        row.classList.add('table-info');
+        setTimeout(() => row.classList.remove('table-info'), 2000);
+    }
+
+    function removePlaceholder(tbody) {
+        const only = tbody.querySelector('tr > td[colspan]');
+        if (only && tbody.rows.length === 1) {
+            tbody.innerHTML = '';
+        }
+    }
+
+    function patchStock(data) {
+        setText('total-staff-count', data.total_staff_count);
+        setText('total-purchase-quantity', data.total_purchase_quantity);
+        setText('total-issue-quantity', data.total_issue_quantity);
+        setText('total-stock-available', data.total_purchase_quantity - data.total_issue_quantity);
+
+        const tbody = document.getElementById('stock-table-body');
+        if (!tbody) {
+            return;
+        }
+        data.stock_data.forEach(item => {
+            const row = document.createElement('tr');
+            row.dataset.category = item.category;
+            row.dataset.subcategory = item.subcategory;
+            row.appendChild(cell(item.category));
+            row.appendChild(cell(item.subcategory));
+            row.appendChild(cell(badge('badge stock-purchase', item.total_purchased)));
+            row.appendChild(cell(badge('badge stock-issue', item.total_issued)));
+            row.appendChild(cell(badge('badge stock-available', item.stock_available)));
+
+            const existing = Array.from(tbody.rows).find(r =>
+                r.dataset.category === item.category && r.dataset.subcategory === item.subcategory);
+            if (existing) {
+                existing.replaceWith(row);
+            } else {
+                removePlaceholder(tbody);
+                // keep the table ordered by category, subcategory
+                const key = `${item.category}\u0000${item.subcategory}`;
+                const next = Array.from(tbody.rows).find(r =>
+                    `${r.dataset.category}\u0000${r.dataset.subcategory}` > key);
+                tbody.insertBefore(row, next || null);
+            }
+            flash(row);
+        });
+    }
+
+    function upsertById(tbody, row) {
+        const existing = tbody.querySelector(`tr[data-id="${row.dataset.id}"]`);
+        if (existing) {
+            existing.replaceWith(row);
+        } else {
+            removePlaceholder(tbody);
+            tbody.insertBefore(row, tbody.firstChild);
+        }
+        flash(row);
+    }
+
+    function patchIssues(data) {
+        const tbody = document.getElementById('issue-table-body');
+        if (!tbody) {
+            return;
+        }
+        data.rows.forEach(item => {
+            const row = document.createElement('tr');
+            row.dataset.id = item.id;
+            row.appendChild(cell(item.id));
+            row.appendChild(cell(item.department));
+            row.appendChild(cell(item.staff_name));
+            row.appendChild(cell(item.category_name));
+            row.appendChild(cell(item.subcategory_name));
+            row.appendChild(cell(item.specs));
+            row.appendChild(cell(item.serial_no));
+            row.appendChild(cell(Math.abs(item.quantity)));
+            row.appendChild(cell(formatDate(item.date)));
+            row.appendChild(cell(item.remarks));
+            row.appendChild(cell(item.return_reason));
+            row.appendChild(cell(item.is_return
+                ? badge('badge', 'Returned ✓', 'background-color: #155724; color: white;')
+                : badge('badge', 'Not yet ✗', 'background-color: #495057; color: white;')));
+            upsertById(tbody, row);
+        });
+    }
+
+    function patchPurchases(data) {
+        const tbody = document.getElementById('purchase-table-body');
+        if (!tbody) {
+            return;
+        }
+        data.rows.slice().reverse().forEach(item => {
+            const row = document.createElement('tr');
+            row.className = 'purchase-row';
+            row.dataset.id = item.id;
+            row.dataset.date = item.date;
+            row.dataset.vendor = item.vendor;
+            row.dataset.category = item.category;
+            row.appendChild(cell(item.id));
+            row.appendChild(cell(item.vendor));
+            row.appendChild(cell(formatDate(item.date)));
+            row.appendChild(cell(item.category));
+            row.appendChild(cell(item.subcategory));
+            row.appendChild(cell(item.specs));
+            row.appendChild(cell(item.remarks));
+            row.appendChild(cell(item.serial_no));
+            row.appendChild(cell(item.quantity));
+            row.appendChild(cell(`Rs ${Math.round(item.unit_price)}`));
+            row.appendChild(cell(`Rs ${Math.round(item.total_price)}`));
+            if (item.bill_image) {
+                const link = document.createElement('a');
+                link.href = `/static/uploads/${encodeURIComponent(item.bill_image)}`;
+                link.target = '_blank';
+                link.className = 'btn btn-sm btn-outline-info';
+                link.innerHTML = '<i class="fas fa-eye me-1"></i>View';
+                row.appendChild(cell(link));
+            } else {
+                row.appendChild(cell(badge('text-muted', 'No Bill')));
+            }
+            upsertById(tbody, row);
+        });
+    }
+
+    function patchAlerts(data) {
+        const el = document.getElementById('low-stock-badge');
+        if (el) {
+            el.textContent = data.count;
+            el.classList.toggle('d-none', !data.count);
+        }
+    }
+
+    function pollAlerts() {
+        if (document.hidden) {
+            return;
+        }
+        fetch('/api/alerts')
+            .then(response => response.ok ? response.json() : null)
+            .then(data => data && patchAlerts(data))
+            .catch(() => {});
+    }
+
+    let source = null;
+
+    function connect() {
+        source = new EventSource('/events');
+        source.addEventListener('alerts', e => patchAlerts(JSON.parse(e.data)));
+        source.addEventListener('stock', e => patchStock(JSON.parse(e.data)));
+        source.addEventListener('issue', e => patchIssues(JSON.parse(e.data)));
+        source.addEventListener('purchase', e => patchPurchases(JSON.parse(e.data)));
+        // EventSource gives up on any non-stream answer without saying which.
+        // A 204 means the session has ended, so stay closed; anything else
+        // (such as a 429 when no stream slot is free) is retried later.
+        source.addEventListener('error', () => {
+            if (source.readyState !== EventSource.CLOSED) {
+                return;
+            }
+            fetch('/events', {method: 'HEAD'})
+                .then(response => {
+                    if (response.status !== 204) {
+                        setTimeout(connect, RECONNECT_DELAY_MS);
+                    }
+                })
+                .catch(() => setTimeout(connect, RECONNECT_DELAY_MS));
+        });
+    }
+
+    connect();
+    window.addEventListener('beforeunload', () => source.close());
+})();
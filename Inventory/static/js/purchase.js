@@ -0,0 +1,461 @@
+// Categories are embedded in the page as a JSON data block
+const categoriesData = JSON.parse(document.getElementById('categories-data').textContent);
+
+function populateCategoryDropdown(dropdown) {
+    dropdown.innerHTML = '<option value="">Choose category...</option>';
+    categoriesData.forEach(category => {
+        const option = document.createElement('option');
+        option.value = category.id;
+        option.textContent = category.name;
+        dropdown.appendChild(option);
+    });
+
+    // Add "Add New Category" option
+    const addNewOption = document.createElement('option');
+    addNewOption.value = 'add_new_category';
+    addNewOption.textContent = '+ Add New Category';
+    addNewOption.style.fontStyle = 'italic';
+    addNewOption.style.color = '#0d6efd';
+    dropdown.appendChild(addNewOption);
+}
+
+async function populateSubcategoryDropdown(categoryID, subcategoryDropdown) {
+    subcategoryDropdown.innerHTML = '<option value="">Choose subcategory...</option>';
+    if (!categoryID || categoryID === 'add_new_category') {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/get_subcategories/${categoryID}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const subcategories = await response.json();
+
+        subcategories.forEach(subcat => {
+            const option = document.createElement('option');
+            option.value = subcat.id;
+            option.textContent = subcat.name;
+            subcategoryDropdown.appendChild(option);
+        });
+
+        // Add "Add New Subcategory" option if there are subcategories loaded
+        const addNewOption = document.createElement('option');
+        addNewOption.value = 'add_new_subcategory';
+        addNewOption.textContent = '+ Add New Subcategory';
+        addNewOption.style.fontStyle = 'italic';
+        addNewOption.style.color = '#0d6efd';
+        subcategoryDropdown.appendChild(addNewOption);
+
+    } catch (error) {
+        console.error("Error fetching subcategories:", error);
+        const errorOption = document.createElement('option');
+        errorOption.value = '';
+        errorOption.textContent = 'Error loading subcategories';
+        subcategoryDropdown.appendChild(errorOption);
+    }
+}
+
+function setupDropdowns(itemCard) {
+    const categoryDropdown = itemCard.querySelector('.category-dropdown');
+    const subcategoryDropdown = itemCard.querySelector('.subcategory-dropdown');
+    const newCategoryInput = itemCard.querySelector('.new-category-input');
+    const newSubcategoryInput = itemCard.querySelector('.new-subcategory-input');
+
+    populateCategoryDropdown(categoryDropdown);
+
+    categoryDropdown.addEventListener('change', async function() {
+        const categoryID = this.value;
+        // Hide both input fields initially
+        newCategoryInput.style.display = 'none';
+        newSubcategoryInput.style.display = 'none';
+
+        if (categoryID === 'add_new_category') {
+            // Show the new category input
+            newCategoryInput.style.display = 'block';
+            newCategoryInput.querySelector('input').focus();
+            subcategoryDropdown.innerHTML = '<option value="">-- First Save New Category --</option>';
+        } else {
+            // Fetch and populate subcategories
+            subcategoryDropdown.innerHTML = '<option value="">Loading...</option>';
+            await populateSubcategoryDropdown(categoryID, subcategoryDropdown);
+        }
+    });
+
+    subcategoryDropdown.addEventListener('change', () => {
+        if (subcategoryDropdown.value === 'add_new_subcategory') {
+            // Show new subcategory input
+            newSubcategoryInput.style.display = 'block';
+            newSubcategoryInput.querySelector('input').focus();
+        } else {
+            newSubcategoryInput.style.display = 'none';
+        }
+    });
+
+    // Setup price calculation and save/cancel button listeners
+    setupItemEventListeners(itemCard);
+    setupAddCategoryFunctionality(itemCard);
+}
+
+function setupAddCategoryFunctionality(itemCard) {
+    const newCategoryInput = itemCard.querySelector('.new-category-input');
+    const newSubcategoryInput = itemCard.querySelector('.new-subcategory-input');
+
+    // Save Category functionality
+    itemCard.querySelector('.save-category-btn').addEventListener('click', async () => {
+        const categoryName = newCategoryInput.querySelector('input').value.trim();
+        if (categoryName) {
+            await saveNewCategory(categoryName, itemCard);
+        } else {
+            alert('Please enter a category name');
+        }
+    });
+
+    // Cancel Category functionality
+    itemCard.querySelector('.cancel-category-btn').addEventListener('click', () => {
+        const categorySelect = itemCard.querySelector('.category-dropdown');
+        newCategoryInput.style.display = 'none';
+        newCategoryInput.querySelector('input').value = '';
+        // Reset dropdown to default
+        categorySelect.value = '';
+    });
+
+    // Save Subcategory functionality
+    itemCard.querySelector('.save-subcategory-btn').addEventListener('click', async () => {
+        const subcategoryName = newSubcategoryInput.querySelector('input').value.trim();
+        // FIX: Use the correct class 'category-dropdown' to find the selected category ID
+        const categoryId = itemCard.querySelector('.category-dropdown').value;
+        if (subcategoryName && categoryId) {
+            await saveNewSubcategory(subcategoryName, categoryId, itemCard);
+        } else {
+            alert('Please enter a subcategory name and select a category first');
+        }
+    });
+
+    // Cancel Subcategory functionality
+    itemCard.querySelector('.cancel-subcategory-btn').addEventListener('click', () => {
+        const subcategorySelect = itemCard.querySelector('.subcategory-dropdown');
+        newSubcategoryInput.style.display = 'none';
+        newSubcategoryInput.querySelector('input').value = '';
+        // Reset dropdown to default
+        subcategorySelect.value = '';
+    });
+
+    // Enter key support
+    newCategoryInput.querySelector('input').addEventListener('keypress', (e) => {
+        if (e.key === 'Enter') {
+            itemCard.querySelector('.save-category-btn').click();
+        }
+    });
+
+    newSubcategoryInput.querySelector('input').addEventListener('keypress', (e) => {
+        if (e.key === 'Enter') {
+            itemCard.querySelector('.save-subcategory-btn').click();
+        }
+    });
+}
+
+async function saveNewCategory(categoryName, itemCard) {
+    try {
+        const response = await fetch('/add_category', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ name: categoryName })
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            const newCategoryInput = itemCard.querySelector('.new-category-input');
+            newCategoryInput.style.display = 'none';
+            newCategoryInput.querySelector('input').value = '';
+
+            categoriesData.push({ id: result.category_id, name: categoryName });
+
+            // Refresh all category dropdowns on the page
+            document.querySelectorAll('.category-dropdown').forEach(dropdown => {
+                const currentVal = dropdown.value;
+                populateCategoryDropdown(dropdown);
+                dropdown.value = currentVal; // try to preserve selection
+            });
+
+            // Select the new category in the current card
+            const categorySelect = itemCard.querySelector('.category-dropdown');
+            categorySelect.value = result.category_id;
+
+            // Trigger change to load subcategories
+            categorySelect.dispatchEvent(new Event('change'));
+
+            alert('Category added successfully!');
+        } else {
+            alert('Error adding category: ' + result.message);
+        }
+    } catch (error) {
+        alert('Error adding category. Please try again.');
+        console.error('Error:', error);
+    }
+}
+
+async function saveNewSubcategory(subcategoryName, categoryId, itemCard) {
+    try {
+        const response = await fetch('/add_subcategory', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ 
+                name: subcategoryName,
+                category_id: categoryId 
+            })
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            const newSubcategoryInput = itemCard.querySelector('.new-subcategory-input');
+            newSubcategoryInput.style.display = 'none';
+            newSubcategoryInput.querySelector('input').value = '';
+
+            const subcategorySelect = itemCard.querySelector('.subcategory-dropdown');
+            await populateSubcategoryDropdown(categoryId, subcategorySelect);
+            subcategorySelect.value = result.subcategory_id;
+
+            alert('Subcategory added successfully!');
+        } else {
+            alert('Error adding subcategory: ' + result.message);
+        }
+    } catch (error) {
+        alert('Error adding subcategory. Please try again.');
+        console.error('Error:', error);
+    }
+}
+
+document.getElementById('add-item').addEventListener('click', function () {
+    const itemGroupContainer = document.getElementById('purchase-group');
+    const firstItemCard = itemGroupContainer.querySelector('.purchase-item');
+
+    if (firstItemCard.style.display === 'none') {
+        // Show the first card
+        firstItemCard.style.display = 'block';
+        firstItemCard.querySelectorAll('input:not(.total-price)').forEach(input => {
+            if (input.name === 'quantity[]') {
+                input.value = '1';
+            } else {
+                input.value = '';
+            }
+        });
+        firstItemCard.querySelectorAll('textarea').forEach(textarea => textarea.value = '');
+        firstItemCard.querySelectorAll('select').forEach(select => {
+            select.innerHTML = '';
+        });
+        firstItemCard.querySelector('.total-price').value = 'Rs 0.00';
+        setupDropdowns(firstItemCard);
+    } else {
+        // Clone and add new card
+        const clone = firstItemCard.cloneNode(true);
+        clone.style.display = 'block';
+        clone.querySelectorAll('input:not(.total-price)').forEach(input => {
+            if (input.name === 'quantity[]') {
+                input.value = '1';
+            } else {
+                input.value = '';
+            }
+        });
+        clone.querySelectorAll('textarea').forEach(textarea => textarea.value = '');
+        clone.querySelectorAll('select').forEach(select => select.innerHTML = '');
+        clone.querySelector('.total-price').value = 'Rs 0.00';
+        setupDropdowns(clone);
+        itemGroupContainer.appendChild(clone);
+    }
+
+    // Update item counter in header
+    updateItemCounter();
+});
+
+document.getElementById('purchase-group').addEventListener('click', function (e) {
+    if (e.target.classList.contains('remove-item') || e.target.closest('.remove-item')) {
+        const cards = document.querySelectorAll('.purchase-item');
+        const targetCard = e.target.closest('.purchase-item');
+
+        if (cards.length > 1) {
+            targetCard.remove();
+        } else if (cards.length === 1) {
+            // Reset the last card instead of removing it
+            targetCard.querySelectorAll('input:not(.total-price)').forEach(input => {
+                if (input.name === 'quantity[]') {
+                    input.value = '1';
+                } else {
+                    input.value = '';
+                }
+            });
+            targetCard.querySelectorAll('textarea').forEach(textarea => textarea.value = '');
+            targetCard.querySelectorAll('select').forEach(select => {
+                select.innerHTML = '';
+                if (select.classList.contains('category-select')) {
+                    populateCategoryDropdown(select);
+                }
+            });
+            targetCard.querySelector('.total-price').value = 'Rs 0.00';
+            targetCard.style.display = 'none';
+        }
+        updateItemCounter();
+    }
+});
+
+function updateItemCounter() {
+    const visibleCards = document.querySelectorAll('.purchase-item[style*="block"]').length;
+    const itemsHeader = document.querySelector('h5');
+    if (itemsHeader) {
+        itemsHeader.innerHTML = `<i class="fas fa-list me-2"></i>Items ${visibleCards > 0 ? `(${visibleCards})` : ''}`;
+    }
+}
+
+// Auto-calculate total price
+function calculateTotal(itemCard) {
+    const unitPrice = parseInt(itemCard.querySelector('input[name="unit_price[]"]').value) || 0;
+    const quantity = parseInt(itemCard.querySelector('input[name="quantity[]"]').value) || 0;
+    const total = unitPrice * quantity;
+    const totalField = itemCard.querySelector('.total-price');
+    // FIX: Remove decimal places from the total price display
+    totalField.value = total > 0 ? `Rs ${Math.round(total)}` : 'Rs 0';
+}
+
+// Setup event listeners for new item cards
+function setupItemEventListeners(itemCard) {
+    const unitPriceInput = itemCard.querySelector('input[name="unit_price[]"]');
+    const quantityInput = itemCard.querySelector('input[name="quantity[]"]');
+
+    [unitPriceInput, quantityInput].forEach(input => {
+        input.addEventListener('input', () => calculateTotal(itemCard));
+        input.addEventListener('change', () => calculateTotal(itemCard));
+    });
+}
+
+// Form submission validation
+document.getElementById('purchaseForm').addEventListener('submit', function(e) {
+    const visibleCards = Array.from(document.querySelectorAll('.purchase-item')).filter(card => card.style.display !== 'none');
+
+    if (visibleCards.length === 0) {
+        alert('Please add at least one item before submitting!');
+        e.preventDefault();
+        return;
+    }
+
+    let isValid = true;
+    visibleCards.forEach((card, index) => {
+        const categorySelect = card.querySelector('.category-dropdown');
+        const subcategorySelect = card.querySelector('.subcategory-dropdown');
+        const quantityInput = card.querySelector('input[name="quantity[]"]');
+
+        if (!categorySelect.value || categorySelect.value === 'add_new_category' || !subcategorySelect.value || subcategorySelect.value === 'add_new_subcategory' || !quantityInput.value) {
+            alert(`Item ${index + 1}: Please fill in all required fields (Category, Subcategory, Quantity) and ensure they are not set to 'Add New'.`);
+            isValid = false;
+            return;
+        }
+    });
+
+    if (!isValid) {
+        e.preventDefault();
+    }
+});
+
+// Real-time search for purchase history table
+const searchInput = document.getElementById('purchase-search');
+// FIX: Update the selector to match the new table class
+const tableBody = document.querySelector('.purchase-history-table tbody');
+const tableRows = Array.from(document.querySelectorAll('.purchase-history-table tbody tr.purchase-row'));
+
+if (searchInput && tableRows.length > 0) {
+    searchInput.addEventListener('input', function() {
+        const query = this.value.toLowerCase();
+
+        tableRows.forEach(row => {
+            const rowData = row.innerText.toLowerCase();
+            const isMatch = rowData.includes(query);
+            row.style.display = isMatch ? '' : 'none';
+        });
+    });
+}
+
+// Large exports run as a background job; poll until the file is ready.
+document.getElementById('download-btn').addEventListener('click', function(e) {
+    e.preventDefault();
+    const btn = this;
+    btn.classList.add('disabled');
+    fetch('/jobs/purchases_csv', { method: 'POST' })
+        .then(res => res.json())
+        .then(job => {
+            const poll = () => fetch(job.status_url)
+                .then(res => res.json())
+                .then(status => {
+                    if (status.status === 'done') {
+                        btn.classList.remove('disabled');
+                        window.location.href = status.download_url;
+                    } else if (status.status === 'failed') {
+                        throw new Error(status.error || 'Export failed');
+                    } else {
+                        setTimeout(poll, 1000);
+                    }
+                });
+            return poll();
+        })
+        .catch(err => {
+            btn.classList.remove('disabled');
+            console.error('Export failed:', err);
+            alert(`Export failed: ${err.message}`);
+        });
+});
+
+// --- SORTING FUNCTIONALITY ---
+const sortSelect = document.getElementById('sort-purchases');
+
+if (sortSelect) {
+    sortSelect.addEventListener('change', function() {
+        const sortValue = this.value;
+        const rows = Array.from(document.querySelectorAll('.purchase-history-table tbody tr.purchase-row'));
+
+        rows.sort((a, b) => {
+            let valA, valB;
+
+            switch(sortValue) {
+                case 'date-desc': // Newest to Oldest
+                    valA = new Date(a.dataset.date);
+                    valB = new Date(b.dataset.date);
+                    return valB - valA;
+
+                case 'date-asc': // Oldest to Newest
+                    valA = new Date(a.dataset.date);
+                    valB = new Date(b.dataset.date);
+                    return valA - valB;
+
+                case 'vendor-asc': // A to Z
+                    valA = a.dataset.vendor.toLowerCase();
+                    valB = b.dataset.vendor.toLowerCase();
+                    return valA.localeCompare(valB);
+
+                case 'vendor-desc': // Z to A
+                    valA = a.dataset.vendor.toLowerCase();
+                    valB = b.dataset.vendor.toLowerCase();
+                    return valB.localeCompare(valA);
+
+                case 'category-asc': // A to Z
+                    valA = a.dataset.category.toLowerCase();
+                    valB = b.dataset.category.toLowerCase();
+                    return valA.localeCompare(valB);
+
+                case 'category-desc': // Z to A
+                    valA = a.dataset.category.toLowerCase();
+                    valB = b.dataset.category.toLowerCase();
+                    return valB.localeCompare(valA);
+
+                default:
+                    return 0;
+            }
+        });
+
+        // Re-append rows in sorted order
+        rows.forEach(row => tableBody.appendChild(row));
+    });
+}
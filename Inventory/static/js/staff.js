@@ -0,0 +1,117 @@
+    function toggleCustomDept(select) {
+        const input = document.getElementById('customDeptInput');
+        if (select.value === 'Other') {
+            input.classList.remove('d-none');
+            input.required = true;
+        } else {
+            input.classList.add('d-none');
+            input.required = false;
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+    // Department filter (existing code)
+    const deptFilter = document.getElementById('dept-filter');
+    const staffTable = document.querySelector('.staff-table');
+    if (deptFilter && staffTable) {
+        const rows = staffTable.querySelectorAll('tbody tr');
+        function populateDeptFilter() {
+            const departments = new Set();
+            rows.forEach(row => {
+                const deptCell = row.cells[1];
+                if (deptCell && deptCell.textContent.trim()) {
+                    departments.add(deptCell.textContent.trim());
+                }
+            });
+            deptFilter.innerHTML = '<option value="all">All Departments</option>';
+            departments.forEach(dept => {
+                const option = document.createElement('option');
+                option.value = dept;
+                option.textContent = dept;
+                deptFilter.appendChild(option);
+            });
+        }
+        populateDeptFilter();
+        deptFilter.addEventListener('change', function() {
+            const selectedDept = this.value;
+            rows.forEach(row => {
+                const deptCell = row.cells[1];
+                if (deptCell) {
+                    const rowDept = deptCell.textContent.trim();
+                    row.style.display = (selectedDept === 'all' || rowDept === selectedDept) ? '' : 'none';
+                }
+            });
+        });
+    }
+
+    // Toggle search box
+    const toggleSearchBtn = document.getElementById('toggle-search');
+    const searchBoxWrapper = document.getElementById('search-box-wrapper');
+    const searchInput = document.getElementById('staff-search');
+    if (toggleSearchBtn && searchBoxWrapper) {
+        toggleSearchBtn.addEventListener('click', function() {
+            if (searchBoxWrapper.style.display === 'none') {
+                searchBoxWrapper.style.display = '';
+                searchInput.focus();
+            } else {
+                searchBoxWrapper.style.display = 'none';
+                searchInput.value = '';
+                // Reset table rows when hiding search
+                if (staffTable) {
+                    const rows = staffTable.querySelectorAll('tbody tr');
+                    rows.forEach(row => row.style.display = '');
+                }
+            }
+        });
+    }
+
+    // Staff search functionality
+    if (searchInput && staffTable) {
+        const rows = staffTable.querySelectorAll('tbody tr');
+        searchInput.addEventListener('input', function(e) {
+            const query = e.target.value.toLowerCase();
+            rows.forEach(row => {
+                const name = row.cells[2]?.textContent.toLowerCase() || '';
+                const designation = row.cells[3]?.textContent.toLowerCase() || '';
+                const matches =
+                    name.includes(query) ||
+                    designation.includes(query);
+                row.style.display = matches ? '' : 'none';
+            });
+        });
+    }
+
+    // Populate and handle edit staff modal
+    const editStaffModal = document.getElementById('editStaffModal');
+    if (editStaffModal) {
+        editStaffModal.addEventListener('show.bs.modal', function(event) {
+            const button = event.relatedTarget;
+            const id = button.getAttribute('data-id');
+            const name = button.getAttribute('data-name');
+            const designation = button.getAttribute('data-designation');
+            const date = button.getAttribute('data-date');
+
+            const modalId = document.getElementById('edit-staff-id');
+            const modalName = document.getElementById('edit-staff-name');
+            const modalDesignation = document.getElementById('edit-staff-designation');
+            const modalDate = document.getElementById('edit-staff-date');
+
+            if (modalId) modalId.value = id;
+            if (modalName) modalName.value = name;
+            if (modalDesignation) modalDesignation.value = designation;
+            if (modalDate) modalDate.value = date;
+        });
+    }
+
+    // Edit button click handler
+    document.querySelectorAll('.edit-btn').forEach(btn => {
+        btn.addEventListener('click', function() {
+            document.getElementById('edit-staff-id').value = this.dataset.id;
+            document.getElementById('edit-staff-name').value = this.dataset.name;
+            document.getElementById('edit-staff-designation').value = this.dataset.designation;
+            document.getElementById('edit-staff-date').value = this.dataset.date || '';
+            var editModal = new bootstrap.Modal(document.getElementById('editStaffModal'));
+            editModal.show();
+        });
+    });
+});
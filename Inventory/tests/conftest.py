@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+# The tables as they were before any startup migration ran, matching the
+# shipped inventory.db.
+LEGACY_SCHEMA = '''
+CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+CREATE TABLE subcategories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, category_id INTEGER NOT NULL);
+CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, category_id INTEGER, subcategory_id INTEGER, specs TEXT, remarks TEXT);
+CREATE TABLE staff (id INTEGER PRIMARY KEY AUTOINCREMENT, dept TEXT NOT NULL, name TEXT NOT NULL, designation TEXT NOT NULL,
+    date_of_joining TEXT);
+CREATE TABLE bills (id INTEGER PRIMARY KEY AUTOINCREMENT, vendor TEXT NOT NULL, date TEXT NOT NULL, remarks TEXT, bill_image TEXT);
+CREATE TABLE purchases (id INTEGER PRIMARY KEY AUTOINCREMENT, item_id INTEGER, vendor TEXT, unit_price REAL NOT NULL,
+    quantity INTEGER NOT NULL, total_price REAL, date TEXT, remarks TEXT, bill_id INTEGER, serial_no TEXT, bill_image TEXT);
+CREATE TABLE issues (id INTEGER PRIMARY KEY AUTOINCREMENT, dept_id INTEGER, item_id INTEGER, quantity INTEGER NOT NULL, date TEXT,
+    specs TEXT, remarks TEXT, department TEXT, staff_name TEXT, item_name TEXT, category TEXT, subcategory TEXT,
+    is_return INTEGER DEFAULT 0, return_reason TEXT, return_date TEXT, serial_no TEXT);
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, role TEXT NOT NULL DEFAULT 'user');
+'''
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """Connection to a fresh database with the legacy tables and no migrations."""
+    monkeypatch.setattr(db, 'DATABASE', str(tmp_path / 'inventory.db'))
+    # site shards are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    conn = db.get_db_connection()
+    conn.executescript(LEGACY_SCHEMA)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def database(legacy_db, monkeypatch):
+    """The legacy database after the same startup steps as create_app()."""
+    from alerts import init_alerts
+    from catalog import migrate_item_keys, clear_resolver_cache
+    from staffing import migrate_issue_staff
+    from changes import init_changes
+    import sites
+
+    monkeypatch.setattr(sites, '_sites', {})
+    clear_resolver_cache()
+    db.init_db()
+    init_alerts(legacy_db)
+    migrate_item_keys(legacy_db)
+    migrate_issue_staff(legacy_db)
+    sites.init_sites(legacy_db)
+    init_changes(legacy_db)
+    yield legacy_db
+    clear_resolver_cache()
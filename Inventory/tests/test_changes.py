@@ -0,0 +1,21 @@
+import changes
+import search
+
+
+def test_renaming_a_subcategory_moves_the_cursor_and_reindexes_its_items(database):
+    conn = database
+    conn.executescript('''
+        INSERT INTO categories (id, name) VALUES (1, 'IT');
+        INSERT INTO subcategories (id, name, category_id) VALUES (1, 'Notebook', 1);
+        INSERT INTO items (id, category_id, subcategory_id, specs, specs_key) VALUES (1, 1, 1, 'ThinkPad E14', 'thinkpad e14');
+    ''')
+    indexes = search.SearchIndexes()
+    indexes.refresh()
+    before = changes.current_cursor(conn)
+
+    conn.execute("UPDATE subcategories SET name = 'Laptop' WHERE id = 1")
+    conn.commit()
+
+    assert changes.current_cursor(conn) > before
+    [hit] = indexes.search('specs', 'thinkpad')
+    assert hit['subcategory'] == 'Laptop'
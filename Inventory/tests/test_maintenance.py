@@ -0,0 +1,47 @@
+import sqlite3
+import threading
+import time
+
+import db
+import maintenance
+
+
+def _fill(conn, rows):
+    conn.execute('CREATE TABLE IF NOT EXISTS filler (id INTEGER PRIMARY KEY, data BLOB)')
+    conn.executemany('INSERT INTO filler (data) VALUES (randomblob(2000))', [()] * rows)
+    conn.commit()
+
+
+def test_backup_copies_the_database(legacy_db, tmp_path):
+    _fill(legacy_db, 100)
+    details = maintenance.backup(str(tmp_path / 'backups'))
+    assert details['complete']
+    copy = sqlite3.connect(details['path'])
+    assert copy.execute('SELECT COUNT(*) FROM filler').fetchone()[0] == 100
+    copy.close()
+
+
+def test_backup_under_steady_writes_gives_up_and_keeps_no_partial_copy(legacy_db, tmp_path, monkeypatch):
+    _fill(legacy_db, 200)
+    monkeypatch.setattr(maintenance, 'BACKUP_PAGES_PER_STEP', 5)
+    stop = threading.Event()
+
+    def keep_writing():
+        conn = sqlite3.connect(db.DATABASE, timeout=5)
+        while not stop.is_set():
+            conn.execute('INSERT INTO filler (data) VALUES (randomblob(100))')
+            conn.commit()
+            time.sleep(0.001)
+        conn.close()
+
+    writer = threading.Thread(target=keep_writing)
+    writer.start()
+    try:
+        details = maintenance.backup(str(tmp_path / 'backups'), max_restarts=2)
+    finally:
+        stop.set()
+        writer.join()
+
+    assert not details['complete']
+    assert details['restarts'] == 3
+    assert list((tmp_path / 'backups').iterdir()) == []
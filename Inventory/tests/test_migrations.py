@@ -0,0 +1,62 @@
+from alerts import init_alerts
+from catalog import migrate_item_keys, ITEM_KEY_INDEX
+from staffing import migrate_issue_staff, STAFF_ID_INDEX
+
+
+def _index_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone() is not None
+
+
+def test_migrate_item_keys_merges_duplicates_onto_lowest_id(legacy_db):
+    conn = legacy_db
+    init_alerts(conn)
+    conn.executescript('''
+        INSERT INTO categories (id, name) VALUES (1, 'IT');
+        INSERT INTO subcategories (id, name, category_id) VALUES (1, 'Laptop', 1), (2, 'Mouse', 1);
+        INSERT INTO items (id, category_id, subcategory_id, specs) VALUES
+            (1, 1, 1, 'Core i5, 8GB'),
+            (2, 1, 1, '  core i5,   8gb '),
+            (3, 1, 1, 'Core i7, 16GB'),
+            (4, 1, 2, '-'),
+            (5, 1, 2, NULL);
+        INSERT INTO purchases (item_id, unit_price, quantity, date) VALUES (1, 100, 1, '2025-01-01'), (2, 100, 2, '2025-01-02'), (5, 5, 4, '2025-01-03');
+        INSERT INTO issues (item_id, quantity, date) VALUES (2, 1, '2025-02-01'), (5, 1, '2025-02-01');
+        INSERT INTO reorder_thresholds (item_id, threshold) VALUES (1, 2), (2, 5);
+    ''')
+
+    assert migrate_item_keys(conn) == 2
+
+    assert [r['id'] for r in conn.execute('SELECT id FROM items ORDER BY id')] == [1, 3, 4]
+    assert [r['item_id'] for r in conn.execute('SELECT item_id FROM purchases ORDER BY id')] == [1, 1, 4]
+    assert [r['item_id'] for r in conn.execute('SELECT item_id FROM issues ORDER BY id')] == [1, 4]
+    # the survivor keeps its own threshold
+    assert [tuple(r) for r in conn.execute('SELECT item_id, threshold FROM reorder_thresholds')] == [(1, 2)]
+    assert conn.execute('SELECT specs FROM items WHERE id = 1').fetchone()[0] == 'Core i5, 8GB'
+    assert _index_exists(conn, ITEM_KEY_INDEX)
+    # once the index exists the migration is a no-op
+    assert migrate_item_keys(conn) == 0
+
+
+def test_migrate_issue_staff_links_by_name_and_department(legacy_db):
+    conn = legacy_db
+    conn.executescript('''
+        INSERT INTO staff (id, dept, name, designation) VALUES
+            (1, 'IT', 'Ali Khan', 'Engineer'),
+            (2, 'HR', 'Sara Ahmed', 'Officer'),
+            (3, 'Finance', 'Sara Ahmed', 'Analyst'),
+            (4, 'Sales', 'Omar Farooq', 'Lead');
+        INSERT INTO issues (id, item_id, quantity, staff_name, department) VALUES
+            (1, 1, 1, ' ali khan ', 'it'),
+            (2, 1, 1, 'Sara Ahmed', 'Finance'),
+            (3, 1, 1, 'Sara Ahmed', 'Admin'),
+            (4, 1, 1, 'Omar Farooq', 'Marketing'),
+            (5, 1, 1, 'Nobody', 'IT');
+    ''')
+
+    assert migrate_issue_staff(conn) == 2
+
+    linked = {r['id']: r['staff_id'] for r in conn.execute('SELECT id, staff_id FROM issues')}
+    # same name and department; a unique name alone; an ambiguous name and an unknown one stay unlinked
+    assert linked == {1: 1, 2: 3, 3: None, 4: 4, 5: None}
+    assert _index_exists(conn, STAFF_ID_INDEX)
+    assert migrate_issue_staff(conn) == 0
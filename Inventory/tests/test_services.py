@@ -0,0 +1,68 @@
+import pytest
+
+import services
+from sites import DEFAULT_SITE_ID
+
+
+@pytest.fixture
+def stocked(database):
+    """Three mice bought at the main site and one staff member to issue them to."""
+    conn = database
+    category_id = conn.execute("INSERT INTO categories (name) VALUES ('Peripherals')").lastrowid
+    subcategory_id = conn.execute('INSERT INTO subcategories (name, category_id) VALUES (?, ?)', ('Mouse', category_id)).lastrowid
+    staff_id = conn.execute("INSERT INTO staff (dept, name, designation, date_of_joining) VALUES ('IT', 'Ali Khan', 'Engineer', '2024-01-01')").lastrowid
+    conn.commit()
+    services.record_purchase(conn, 'Vendor', '2025-01-01', None, DEFAULT_SITE_ID, [{
+        'category_id': category_id, 'subcategory_id': subcategory_id, 'specs': None, 'serial_no': '',
+        'quantity': 3, 'unit_price': 10.0, 'remarks': ''
+    }])
+    return conn, staff_id, {'category_id': str(category_id), 'subcategory_id': str(subcategory_id), 'specs': '', 'serial_no': ''}
+
+
+def _issue(conn, staff_id, *lines):
+    return services.issue_batch(conn, staff_id, '2025-02-01', '', DEFAULT_SITE_ID, list(lines))
+
+
+def _issued(conn):
+    return conn.execute('SELECT COALESCE(SUM(quantity), 0) FROM issues WHERE is_return = 0').fetchone()[0]
+
+
+def test_lines_for_the_same_item_are_checked_together(stocked):
+    conn, staff_id, line = stocked
+    payload, status = _issue(conn, staff_id, dict(line, quantity=2), dict(line, quantity=2))
+    assert status == 400
+    assert 'insufficient stock' in payload['message']
+    assert _issued(conn) == 0  # nothing from the batch was written
+
+
+def test_batch_within_stock_is_issued_and_then_exhausted(stocked):
+    conn, staff_id, line = stocked
+    payload, status = _issue(conn, staff_id, dict(line, quantity=1), dict(line, quantity=2))
+    assert status == 200
+    ids = [r['id'] for r in conn.execute('SELECT id FROM issues ORDER BY id')]
+    assert payload['issue_ids'] == ids
+
+    payload, status = _issue(conn, staff_id, dict(line, quantity=1))
+    assert status == 400
+    assert 'Available: 0' in payload['message']
+    assert _issued(conn) == 3
+
+
+def _bought_item(conn, category_id, subcategory_id, specs):
+    item_id = conn.execute('INSERT INTO items (category_id, subcategory_id, specs, specs_key) VALUES (?, ?, ?, ?)',
+                           (category_id, subcategory_id, specs, specs.casefold())).lastrowid
+    conn.execute("INSERT INTO purchases (item_id, unit_price, quantity, date) VALUES (?, 5, 1, '2025-01-01')", (item_id,))
+    return item_id
+
+
+def test_item_from_another_subcategory_is_rejected(stocked):
+    conn, staff_id, line = stocked
+    keyboards = conn.execute("INSERT INTO subcategories (name, category_id) VALUES ('Keyboard', ?)", (line['category_id'],)).lastrowid
+    _bought_item(conn, line['category_id'], keyboards, 'US layout')
+    wireless_mouse = _bought_item(conn, line['category_id'], line['subcategory_id'], 'Wireless')
+    conn.commit()
+    # a keyboard line whose specs point at a mouse
+    payload, status = _issue(conn, staff_id, dict(line, subcategory_id=str(keyboards), specs=str(wireless_mouse), quantity=1))
+    assert status == 400
+    assert payload['message'] == 'Line 1: Invalid item selected!'
+    assert _issued(conn) == 0
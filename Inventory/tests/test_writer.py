@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+import db
+from writer import Writer
+
+
+def _add_category(conn, name):
+    conn.execute('INSERT INTO categories (name) VALUES (?)', (name,))
+
+
+def _add_category_then_fail(conn, name, committed):
+    _add_category(conn, name)
+    conn.after_commit(lambda: committed.append(name))
+    raise ValueError('bad line')
+
+
+def _add_category_then_rollback(conn, name):
+    _add_category(conn, name)
+    conn.rollback()
+    return 'rolled back'
+
+
+def _category_names(conn):
+    return {r['name'] for r in conn.execute('SELECT name FROM categories')}
+
+
+def test_failed_job_rolls_back_only_itself(legacy_db):
+    writer = Writer()
+    gate = threading.Event()
+    committed = []
+    # hold the writer so the next jobs queue up and commit as one group
+    blocker = writer.submit(lambda conn: gate.wait(5))
+    first = writer.submit(_add_category, 'Laptops')
+    failing = writer.submit(_add_category_then_fail, 'Printers', committed)
+    undone = writer.submit(_add_category_then_rollback, 'Scanners')
+    last = writer.submit(_add_category, 'Monitors')
+    gate.set()
+
+    blocker.result(5)
+    first.result(5)
+    with pytest.raises(ValueError):
+        failing.result(5)
+    assert undone.result(5) == 'rolled back'
+    last.result(5)
+
+    assert _category_names(legacy_db) == {'Laptops', 'Monitors'}
+    assert committed == []  # after_commit callbacks of a failed job are dropped
+    assert writer.failed_jobs == 1
+    assert writer.failed_commits == 0
+
+
+def _names_seen_by_another_connection():
+    conn = db.get_db_connection()
+    try:
+        return _category_names(conn)
+    finally:
+        conn.close()
+
+
+def test_after_commit_runs_once_committed(legacy_db):
+    writer = Writer()
+    seen = []
+
+    def job(conn):
+        _add_category(conn, 'Cables')
+        conn.after_commit(lambda: seen.append(_names_seen_by_another_connection()))
+
+    writer.run(job)
+    assert seen == [{'Cables'}]
@@ -0,0 +1,211 @@
+from concurrent.futures import Future
+import threading
+import logging
+import sqlite3
+import queue
+import time
+import os
+
+import db
+
+# Single writer per worker process. Request handlers do not commit on their
+# own connections; they hand a function to write(), which runs it on the
+# writer thread as fn(conn, *args) and returns its result (or raises its
+# exception) in the calling thread.
+#
+# Jobs that queue up while a commit is in progress are applied together in
+# one transaction, each under its own savepoint, and made durable by a single
+# commit: a burst of concurrent writes costs one fsync rather than one per
+# request, and a job that raises only rolls back its own savepoint. Inside a
+# job conn.commit() is a no-op and conn.rollback() undoes just that job, so
+# the service functions run unchanged; conn.after_commit(callback) defers
+# work such as caching new ids until the group is durable. MAX_BATCH caps
+# how many jobs one commit carries, which bounds how long any job waits
+# behind the others.
+#
+# Workers still share the database file; BEGIN IMMEDIATE with a busy timeout
+# makes their writers take turns instead of failing with "database is locked".
+
+MAX_BATCH = int(os.environ.get('INVENTORY_WRITE_BATCH', 64))
+BUSY_TIMEOUT = float(os.environ.get('INVENTORY_WRITE_BUSY_TIMEOUT', 10))
+WRITE_TIMEOUT = float(os.environ.get('INVENTORY_WRITE_TIMEOUT', 30))
+# extra wait for a job that had already started when WRITE_TIMEOUT ran out
+WRITE_GRACE = float(os.environ.get('INVENTORY_WRITE_GRACE', 10))
+
+
+class JobConnection:
+    """The writer's connection as seen by one job."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.callbacks = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass  # the writer commits the whole group
+
+    def rollback(self):
+        self._conn.execute('ROLLBACK TO job')
+        self.callbacks.clear()
+
+    def after_commit(self, callback):
+        """Run `callback` once this job's changes are committed; dropped if they are not."""
+        self.callbacks.append(callback)
+
+    def close(self):
+        pass
+
+
+class Writer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._conn = None
+        self.batches = 0
+        self.jobs = 0
+        self.failed_jobs = 0
+        self.failed_commits = 0
+        self.largest_batch = 0
+        self.avg_commit_ms = 0.0
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own on first use.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='inventory-writer', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(conn, *args, **kwargs); returns a Future resolved after commit."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _connect(self):
+        conn = sqlite3.connect(db.DATABASE, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # readers keep reading while a group commits
+        conn.execute('PRAGMA journal_mode = WAL')
+        return conn
+
+    def _run(self):
+        self._conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            except Exception as e:
+                logging.error(f"Writer batch failed: {e}")
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                self._fail(batch, e)
+
+    def _fail(self, entries, exc):
+        for future, *_ in entries:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _apply(self, batch):
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        done = []
+        for entry in batch:
+            future, fn, args, kwargs = entry
+            if not future.set_running_or_notify_cancel():
+                continue
+            job_conn = JobConnection(conn)
+            conn.execute('SAVEPOINT job')
+            try:
+                result = fn(job_conn, *args, **kwargs)
+            except Exception as e:
+                conn.execute('ROLLBACK TO job')
+                conn.execute('RELEASE job')
+                self.failed_jobs += 1
+                future.set_exception(e)
+                continue
+            conn.execute('RELEASE job')
+            done.append((future, result, job_conn.callbacks))
+
+        started = time.perf_counter()
+        try:
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logging.error(f"Group commit of {len(done)} writes failed: {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self.failed_commits += 1
+            self._fail(done, e)
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.avg_commit_ms = elapsed if not self.avg_commit_ms else 0.8 * self.avg_commit_ms + 0.2 * elapsed
+        self.batches += 1
+        self.jobs += len(done)
+        self.largest_batch = max(self.largest_batch, len(done))
+        for future, result, callbacks in done:
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(f"Writer after-commit callback failed: {e}")
+            future.set_result(result)
+
+    def run(self, fn, *args, **kwargs):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError('write() called from inside a writer job; use the job connection instead')
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(WRITE_TIMEOUT)
+        except TimeoutError:
+            if future.cancel():
+                raise  # never started, so nothing was written
+        # Already running: it normally commits or fails shortly, so report that
+        # outcome, but never hold the request forever on a stuck job.
+        try:
+            return future.result(WRITE_GRACE)
+        except TimeoutError:
+            logging.error(f"Write {getattr(fn, '__name__', fn)} still running after {WRITE_TIMEOUT + WRITE_GRACE:g}s")
+            raise TimeoutError('The write is still running; it may yet be committed') from None
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'batches': self.batches,
+            'jobs': self.jobs,
+            'jobs_per_batch': round(self.jobs / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'failed_jobs': self.failed_jobs,
+            'failed_commits': self.failed_commits,
+            'avg_commit_ms': round(self.avg_commit_ms, 3),
+        }
+
+
+writer = Writer()
+
+
+def write(fn, *args, **kwargs):
+    """Run fn(conn, *args, **kwargs) on the writer thread; returns once it is committed."""
+    return writer.run(fn, *args, **kwargs)
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).lastrowid
+
+
+def execute(sql, params=()):
+    """Run one write statement through the writer; returns the cursor's lastrowid."""
+    return write(_execute, sql, params)
@@ -0,0 +1,75 @@
+import time
+
+_import_started = time.perf_counter()
+
+import logging
+import os
+
+from flask import g
+from app import create_app
+from db import get_db_connection
+import services
+
+# Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+# With preload_app the code below runs once in the master, so every worker
+# forks with modules imported, templates compiled and the database pages
+# already in the OS cache.
+
+logger = logging.getLogger('inventory.startup')
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+def warm_templates(app):
+    """Compile every template into the Jinja cache."""
+    app.jinja_env.cache_size = max(app.jinja_env.cache_size, 400)
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_queries():
+    """Run the hot lookup queries once so their pages sit in the OS page cache.
+
+    SQLite connections must not cross a fork, so the connection is closed
+    here and each worker prepares its own statements on first use.
+    """
+    conn = get_db_connection()
+    services.get_categories(conn)
+    services.stock_summary(conn)
+    conn.close()
+
+
+def instrument_first_request(app):
+    """Log how long the first request handled by each worker process takes."""
+    timed_pids = set()
+
+    @app.before_request
+    def _first_request_started():
+        if os.getpid() not in timed_pids:
+            g.first_request_started = time.perf_counter()
+
+    @app.after_request
+    def _first_request_finished(response):
+        started = g.pop('first_request_started', None)
+        if started is not None and os.getpid() not in timed_pids:
+            timed_pids.add(os.getpid())
+            logger.info('worker %s first request took %.1f ms', os.getpid(), (time.perf_counter() - started) * 1000)
+        return response
+
+
+def build_app():
+    started = time.perf_counter()
+    application = create_app()
+    created = time.perf_counter()
+    template_count = warm_templates(application)
+    warm_queries()
+    instrument_first_request(application)
+    logger.info('imports %.1f ms, create_app %.1f ms, warm-up %.1f ms (%d templates)',
+                IMPORT_SECONDS * 1000, (created - started) * 1000, (time.perf_counter() - created) * 1000, template_count)
+    return application
+
+
+logging.basicConfig(level=logging.INFO)
+app = build_app()